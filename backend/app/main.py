@@ -1,73 +1,267 @@
-from dotenv import load_dotenv
+import logging
 import os
 from pathlib import Path
+from typing import Optional
 
-# Load environment variables from .env.local file
-# Use absolute path to ensure correct loading regardless of working directory
-current_dir = Path(__file__).parent
-project_root = current_dir.parent.parent
-env_file = project_root / '.env.local'
+# INFO by default so debug-level messages are skipped before any formatting;
+# set PROMPT_STUDIO_DEBUG=1 to see them
+logging.basicConfig(level=logging.DEBUG if os.environ.get("PROMPT_STUDIO_DEBUG") == "1" else logging.INFO)
+logger = logging.getLogger(__name__)
 
-if env_file.exists():
-    load_dotenv(env_file)
-    print(f"Loaded environment variables from: {env_file}")
-else:
-    print(f"Warning: .env.local file not found at {env_file}")
+# Resolve the .env.local location once, using absolute paths so loading works
+# regardless of the working directory
+CURRENT_DIR = Path(__file__).parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+ENV_FILE = PROJECT_ROOT / '.env.local'
 
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from fastapi.middleware.cors import CORSMiddleware # Import the CORS middleware
-try:
-    from .routers.analysis import router as analysis_router
-    print(f"✅ Analysis router imported")
-except Exception as e:
-    print(f"❌ Failed to import analysis router: {e}")
+# Parsed env files keyed by (path, mtime) so re-imports (--reload, tests) skip re-parsing
+_ENV_CACHE = {}
 
-try:
-    from .routers.templates import router as templates_router
-    print(f"✅ Templates router imported")
-except Exception as e:
-    print(f"❌ Failed to import templates router: {e}")
+def _load_env_cached(env_file: Path = ENV_FILE) -> bool:
+    """Load environment variables from env_file, re-parsing only when it changes."""
+    from dotenv import dotenv_values
+
+    try:
+        mtime = env_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+    key = (str(env_file), mtime)
+    values = _ENV_CACHE.get(key)
+    if values is None:
+        # Cache even an empty parse so an empty file is not re-read
+        values = {k: v for k, v in dotenv_values(env_file).items() if v is not None}
+        _ENV_CACHE[key] = values
+
+    # Match load_dotenv: never override variables already set in the environment
+    for name, value in values.items():
+        os.environ.setdefault(name, value)
+    return True
 
 try:
-    from .routers.optimization import router as optimization_router
-    print(f"✅ Optimization router imported")
-except Exception as e:
-    print(f"❌ Failed to import optimization router: {e}")
+    # Generated at build time by scripts/dump_env.py
+    from ._env_baked import ENV as _BAKED_ENV
+except ImportError:
+    _BAKED_ENV = None
 
-app = FastAPI(
-    title="Prompt Engineering Studio API",
-    description="API for analyzing and optimizing LLM prompts.",
-    version="0.1.0",
-)
+# In production the environment is injected by the platform, so .env.local is only
+# read for local development (PROMPT_STUDIO_DEV=1) or from the baked snapshot
+if _BAKED_ENV is not None:
+    for _name, _value in _BAKED_ENV.items():
+        os.environ.setdefault(_name, _value)
+    logger.info("Loaded baked environment variables")
+elif os.environ.get("PROMPT_STUDIO_DEV") == "1":
+    if _load_env_cached():
+        logger.info("Loaded environment variables from: %s", ENV_FILE)
+    else:
+        logger.warning(".env.local file not found at %s", ENV_FILE)
+
+from fastapi import FastAPI
+from fastapi.responses import RedirectResponse, Response
 
 # Define the list of origins that are allowed to make requests.
 # For development, this is your frontend's address.
 origins = [
     "http://localhost:5173",
 ]
+_ORIGIN_SET = frozenset(origins)
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+SAFELISTED_HEADERS = {"accept", "accept-language", "content-language", "content-type"}
+
+
+class ASGICORSMiddleware:
+    """
+    CORS handling written directly against the ASGI interface.
+
+    Every header value is encoded once in __init__, so per request the
+    middleware only checks the origin and appends pre-built byte pairs.
+    """
+
+    def __init__(self, app, allow_origins=(), allow_methods=("GET",), allow_headers=(),
+                 allow_credentials: bool = False, max_age: int = 600):
+        self.app = app
+        self.allow_all_origins = "*" in allow_origins
+        # Raw header bytes, so the per-request check is one set lookup with no decoding
+        self.allow_origins = frozenset(o.encode("latin-1") for o in allow_origins)
+        self.allow_all_headers = "*" in allow_headers
+
+        methods = ALL_METHODS if "*" in allow_methods else tuple(allow_methods)
+        self.allow_methods = frozenset(m.encode("latin-1") for m in methods)
+        allowed_headers = SAFELISTED_HEADERS | {h.lower() for h in allow_headers if h != "*"}
+        self.allow_headers = frozenset(h.encode("latin-1") for h in allowed_headers)
+
+        # Headers added to every CORS response
+        self.simple_headers = []
+        if allow_credentials:
+            self.simple_headers.append((b"access-control-allow-credentials", b"true"))
+        if not self.allow_all_origins or allow_credentials:
+            self.simple_headers.append((b"vary", b"Origin"))
+
+        # Headers added to preflight responses
+        self.preflight_headers = [
+            (b"access-control-allow-methods", ", ".join(methods).encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            *self.simple_headers,
+        ]
+        if not self.allow_all_headers:
+            self.preflight_headers.append(
+                (b"access-control-allow-headers", ", ".join(sorted(allowed_headers)).encode("latin-1"))
+            )
+
+    def is_allowed_origin(self, origin: bytes) -> bool:
+        if self.allow_all_origins:
+            return True
+        return origin in self.allow_origins
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        origin = headers.get(b"origin")
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and b"access-control-request-method" in headers:
+            await self.preflight_response(headers, origin, send)
+            return
+
+        if not self.is_allowed_origin(origin):
+            await self.app(scope, receive, send)
+            return
+
+        origin_header = (b"access-control-allow-origin", origin)
 
-# Add the CORS middleware to your application
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"], # Allow all methods (GET, POST, etc.)
-    allow_headers=["*"], # Allow all headers
-)
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), origin_header, *self.simple_headers]
+            await send(message)
 
-app.include_router(analysis_router, prefix="/api")
-app.include_router(templates_router, prefix="/api")
-app.include_router(optimization_router, prefix="/api")
+        await self.app(scope, receive, send_with_cors)
 
-print("All routers registered successfully")
+    async def preflight_response(self, headers: dict, origin: bytes, send):
+        response_headers = list(self.preflight_headers)
+        failures = []
+
+        if self.is_allowed_origin(origin):
+            response_headers.append((b"access-control-allow-origin", origin))
+        else:
+            failures.append("origin")
+
+        if headers[b"access-control-request-method"] not in self.allow_methods:
+            failures.append("method")
+
+        requested_headers = headers.get(b"access-control-request-headers")
+        if self.allow_all_headers and requested_headers is not None:
+            response_headers.append((b"access-control-allow-headers", requested_headers))
+        elif requested_headers is not None:
+            for header in requested_headers.lower().split(b","):
+                if header.strip() not in self.allow_headers:
+                    failures.append("headers")
+                    break
+
+        if failures:
+            body = ("Disallowed CORS " + ", ".join(failures)).encode("utf-8")
+            status = 400
+            response_headers.append((b"content-type", b"text/plain; charset=utf-8"))
+        else:
+            body = b"OK"
+            status = 200
+        response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
 
 
-@app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
-@app.get("/api/health", tags=["Health"])
+# Built once; the health check is polled constantly and never changes
+_HEALTH_RESPONSE = Response(content=b'{"status":"ok"}', media_type="application/json")
+
 async def health_check():
     """Check if the API is running."""
-    return {"status": "ok"}
\ No newline at end of file
+    return _HEALTH_RESPONSE
+
+
+def create_app(*, include_docs: Optional[bool] = None, defer_openapi: bool = True) -> FastAPI:
+    """
+    Build the FastAPI application.
+
+    Router imports live here rather than at module top so that importing
+    app.main (tests, CLI tooling) does not pull in dspy and friends until
+    the app object is actually needed.
+
+    Args:
+        include_docs: Serve /openapi.json and the /docs UI; defaults to the
+            PROMPT_STUDIO_ENABLE_DOCS=1 environment flag
+        defer_openapi: Generate the OpenAPI schema on first request instead of at startup
+    """
+    try:
+        from .routers.analysis import router as analysis_router
+        logger.debug("Analysis router imported")
+    except Exception as e:
+        logger.error("Failed to import analysis router: %s", e)
+        raise
+
+    try:
+        from .routers.templates import router as templates_router
+        logger.debug("Templates router imported")
+    except Exception as e:
+        logger.error("Failed to import templates router: %s", e)
+        raise
+
+    try:
+        from .routers.optimization import router as optimization_router
+        logger.debug("Optimization router imported")
+    except Exception as e:
+        logger.error("Failed to import optimization router: %s", e)
+        raise
+
+    if include_docs is None:
+        include_docs = os.environ.get("PROMPT_STUDIO_ENABLE_DOCS") == "1"
+
+    app = FastAPI(
+        title="Prompt Engineering Studio API",
+        description="API for analyzing and optimizing LLM prompts.",
+        version="0.1.0",
+        openapi_url="/openapi.json" if include_docs else None,
+        docs_url="/docs" if include_docs else None,
+        redoc_url=None,
+    )
+
+    # Add the CORS middleware to your application
+    app.add_middleware(
+        ASGICORSMiddleware,
+        allow_origins=_ORIGIN_SET,
+        allow_credentials=True,
+        allow_methods=["*"], # Allow all methods (GET, POST, etc.)
+        allow_headers=["*"], # Allow all headers
+    )
+
+    app.include_router(analysis_router, prefix="/api")
+    app.include_router(templates_router, prefix="/api")
+    app.include_router(optimization_router, prefix="/api")
+
+    logger.info("All routers registered successfully")
+
+    if include_docs:
+        app.add_api_route("/", root, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/api/health", health_check, methods=["GET"], tags=["Health"])
+
+    if include_docs and not defer_openapi:
+        app.openapi()
+
+    return app
+
+
+def __getattr__(name: str):
+    # PEP 562: build the app on first access (e.g. uvicorn's "app.main:app")
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
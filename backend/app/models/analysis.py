@@ -1,21 +1,54 @@
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import Form
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, Optional, Tuple
+import os
+
+# With PROMPT_STUDIO_DEFER_BUILD=1, models build their validators on first use
+# instead of at import, trading a little first-request latency for faster startup
+MODEL_CONFIG = ConfigDict(defer_build=os.environ.get("PROMPT_STUDIO_DEFER_BUILD") == "1")
 
 class AnalyzeRequest(BaseModel):
     """Request model for analyzing a prompt."""
+    model_config = MODEL_CONFIG
+
     prompt: str
-    # This flag will be used later for the LLM-as-Refiner feature
     use_llm_refiner: bool = False
+    llm_provider: str = "ollama"
+    llm_model: str = "gemma:2b"
+    llm_api_key: Optional[str] = None
+
+    @classmethod
+    def as_form(
+        cls,
+        prompt: str = Form(...),
+        use_llm_refiner: bool = Form(False),
+        llm_provider: str = Form("ollama"),
+        llm_model: str = Form("gemma:2b"),
+        llm_api_key: Optional[str] = Form(None)
+    ) -> "AnalyzeRequest":
+        """Dependency that collects the multipart form fields into one validated model."""
+        return cls(
+            prompt=prompt,
+            use_llm_refiner=use_llm_refiner,
+            llm_provider=llm_provider,
+            llm_model=llm_model,
+            llm_api_key=llm_api_key
+        )
 
 class PatternMatch(BaseModel):
     """Response model for a single detected pattern."""
+    # Immutable, so detection results can be cached and shared between requests
+    model_config = ConfigDict(**MODEL_CONFIG, frozen=True)
+
     pattern: str
     confidence: float
-    evidence: List[str]
+    evidence: Tuple[str, ...]
     description: str
     category: str
 
 class AnalyzeResponse(BaseModel):
     """Response model containing all detected patterns."""
+    model_config = MODEL_CONFIG
+
     patterns: Dict[str, PatternMatch]
     
\ No newline at end of file
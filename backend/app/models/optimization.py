@@ -0,0 +1,35 @@
+from fastapi import Form
+from pydantic import BaseModel
+from typing import Optional
+from .analysis import MODEL_CONFIG
+
+class OptimizeParams(BaseModel):
+    """Form parameters for the prompt optimization endpoint."""
+    model_config = MODEL_CONFIG
+
+    prompt: str
+    provider: str # e.g., "ollama", "openrouter", "groq"
+    model: str # e.g., "gemma:2b", "meta-llama/llama-3-8b-instruct"
+    api_key: Optional[str] = None
+    metric: str = "exact_match" # "exact_match" or "llm_as_a_judge"
+    max_iterations: int = 4 # Configurable guardrail for optimization iterations
+
+    @classmethod
+    def as_form(
+        cls,
+        prompt: str = Form(...),
+        provider: str = Form(...),
+        model: str = Form(...),
+        api_key: Optional[str] = Form(None),
+        metric: str = Form("exact_match"),
+        max_iterations: int = Form(4)
+    ) -> "OptimizeParams":
+        """Dependency that collects the multipart form fields into one validated model."""
+        return cls(
+            prompt=prompt,
+            provider=provider,
+            model=model,
+            api_key=api_key,
+            metric=metric,
+            max_iterations=max_iterations
+        )
@@ -1,19 +1,27 @@
 from pydantic import BaseModel
 from typing import List, Dict
-from .analysis import PatternMatch # Re-use the PatternMatch model
+from .analysis import PatternMatch, MODEL_CONFIG # Re-use the PatternMatch model
 
 class SuggestionRequest(BaseModel):
+    model_config = MODEL_CONFIG
+
     patterns: Dict[str, PatternMatch]
 
 class TemplateSuggestion(BaseModel):
+    model_config = MODEL_CONFIG
+
     name: str # e.g., "hwchase17/react"
     score: float # The calculated match score (0-100)
     # We can add more metadata like a description later
 
 class SuggestionResponse(BaseModel):
+    model_config = MODEL_CONFIG
+
     suggestions: List[TemplateSuggestion]
 
 class TemplateMergeRequest(BaseModel):
+    model_config = MODEL_CONFIG
+
     user_prompt: str
     template_slug: str
     provider: str = "ollama"
@@ -21,4 +29,20 @@ class TemplateMergeRequest(BaseModel):
     api_key: str = ""
 
 class TemplateMergeResponse(BaseModel):
-    merged_template: str
\ No newline at end of file
+    model_config = MODEL_CONFIG
+
+    merged_template: str
+
+class TemplateMergeBatchRequest(BaseModel):
+    model_config = MODEL_CONFIG
+
+    user_prompts: List[str] # A single prompt is merged into every template
+    template_slugs: List[str] # A single template is filled from every prompt
+    provider: str = "ollama"
+    model: str = "gemma:2b"
+    api_key: str = ""
+
+class TemplateMergeBatchResponse(BaseModel):
+    model_config = MODEL_CONFIG
+
+    merged_templates: List[str]
@@ -1,42 +1,49 @@
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Depends, Response
 from ..models.analysis import AnalyzeRequest, AnalyzeResponse
-from ..services.pattern_detector import AdvancedPromptPatternDetector
-from typing import Optional
+import orjson
 
 router = APIRouter()
-detector = AdvancedPromptPatternDetector() # Create an instance of the detector
 
-@router.post("/analyze", response_model=AnalyzeResponse, tags=["Analysis"])
+# Shared detector instance, created on first request
+_detector = None
+
+def get_detector():
+    """Return the shared pattern detector, creating it on first use."""
+    global _detector
+    if _detector is None:
+        from ..services.pattern_detector import AdvancedPromptPatternDetector
+        _detector = AdvancedPromptPatternDetector()
+    return _detector
+
+# The response is serialized directly with orjson; AnalyzeResponse only documents the schema
+@router.post("/analyze", responses={200: {"model": AnalyzeResponse}}, tags=["Analysis"])
 async def analyze_prompt(
-    prompt: str = Form(...),
-    use_llm_refiner: bool = Form(False),
-    llm_provider: str = Form("ollama"),
-    llm_model: str = Form("gemma:2b"),
-    llm_api_key: Optional[str] = Form(None)
+    params: AnalyzeRequest = Depends(AnalyzeRequest.as_form),
+    detector = Depends(get_detector)
 ):
     """
     Analyzes the user's prompt to detect prompt engineering patterns.
     Optionally uses LLM refinement for improved accuracy.
     """
-    if not prompt:
+    if not params.prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
 
     try:
         # Step 1: Rule-based pattern detection
-        detected_patterns = detector.detect_patterns(prompt)
+        detected_patterns = detector.detect_patterns(params.prompt)
 
         # Step 2: Optional LLM refinement
-        if use_llm_refiner:
-            refined_patterns = detector.refine_patterns_with_llm(
-                original_prompt=prompt,
+        if params.use_llm_refiner:
+            detected_patterns = detector.refine_patterns_with_llm(
+                original_prompt=params.prompt,
                 detected_patterns=detected_patterns,
-                provider=llm_provider,
-                model=llm_model,
-                api_key=llm_api_key
+                provider=params.llm_provider,
+                model=params.llm_model,
+                api_key=params.llm_api_key
             )
-            return AnalyzeResponse(patterns=refined_patterns)
-        else:
-            return AnalyzeResponse(patterns=detected_patterns)
+
+        payload = {"patterns": {name: match.model_dump() for name, match in detected_patterns.items()}}
+        return Response(content=orjson.dumps(payload), media_type="application/json")
 
     except Exception as e:
         # Basic error handling
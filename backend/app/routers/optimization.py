@@ -1,24 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from ..services.dspy_service import DspyService
-from typing import Optional
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from ..models.optimization import OptimizeParams
 
 router = APIRouter()
-dspy_service = DspyService()
+
+# Created on first request so importing this router does not load dspy
+_dspy_service = None
+
+def get_dspy_service():
+    """Return the shared DspyService, creating it on first use."""
+    global _dspy_service
+    if _dspy_service is None:
+        from ..services.dspy_service import DspyService
+        _dspy_service = DspyService()
+    return _dspy_service
 
 @router.post("/optimize/estimate", tags=["Optimization"])
 async def estimate_optimization_cost(
     dataset: UploadFile = File(...),
     provider: str = Form(...),
     model: str = Form(...),
-    max_iterations: int = Form(4)
+    max_iterations: int = Form(4),
+    dspy_service = Depends(get_dspy_service)
 ):
     """
     Estimate the cost of running prompt optimization before execution.
     """
     try:
-        file_content = await dataset.read()
+        # Hand the dataset loader the spooled upload file directly instead of copying it into memory
+        await dataset.seek(0)
         estimation = dspy_service.estimate_optimization_cost(
-            file_content=file_content,
+            file=dataset.file,
             filename=dataset.filename,
             provider=provider,
             model=model,
@@ -30,31 +42,27 @@ async def estimate_optimization_cost(
 
 @router.post("/optimize", tags=["Optimization"])
 async def optimize_prompt_endpoint(
-    prompt: str = Form(...),
     dataset: UploadFile = File(...),
-    provider: str = Form(...), # e.g., "ollama", "openrouter", "groq"
-    model: str = Form(...),      # e.g., "gemma:2b", "meta-llama/llama-3-8b-instruct"
-    api_key: str = Form(None),
-    metric: str = Form("exact_match"), # "exact_match" or "llm_as_a_judge"
-    max_iterations: int = Form(4)      # Configurable guardrail for optimization iterations
+    params: OptimizeParams = Depends(OptimizeParams.as_form),
+    dspy_service = Depends(get_dspy_service)
 ):
     """
     Optimizes a prompt using a provided dataset (CSV or JSONL).
     """
     try:
-        file_content = await dataset.read()
-        optimized_prompt = dspy_service.optimize_prompt(
-            original_prompt=prompt,
-            file_content=file_content,
+        await dataset.seek(0)
+        optimized_prompt = await dspy_service.aoptimize_prompt(
+            original_prompt=params.prompt,
+            file=dataset.file,
             filename=dataset.filename,
-            provider=provider,
-            model=model,
-            api_key=api_key,
-            metric=metric,
-            max_iterations=max_iterations
+            provider=params.provider,
+            model=params.model,
+            api_key=params.api_key,
+            metric=params.metric,
+            max_iterations=params.max_iterations
         )
         return {
-            "original_prompt": prompt,
+            "original_prompt": params.prompt,
             "optimized_prompt": optimized_prompt
         }
     except Exception as e:
@@ -68,17 +76,20 @@ async def run_ab_test(
     provider: str = Form(...),
     model: str = Form(...),
     api_key: str = Form(None),
-    metric: str = Form("exact_match")
+    metric: str = Form("exact_match"),
+    dspy_service = Depends(get_dspy_service)
 ):
     """
     Run A/B test comparison between two prompts using a provided dataset.
     """
     try:
-        file_content = await dataset.read()
-        ab_test_results = dspy_service.run_ab_test(
+        await dataset.seek(0)
+        # The A/B test blocks on its worker threads, keep it off the event loop
+        ab_test_results = await asyncio.to_thread(
+            dspy_service.run_ab_test,
             prompt_a=prompt_a,
             prompt_b=prompt_b,
-            file_content=file_content,
+            file=dataset.file,
             filename=dataset.filename,
             provider=provider,
             model=model,
@@ -1,112 +1,42 @@
-from fastapi import APIRouter, HTTPException, Form
-from ..models.templates import SuggestionRequest, SuggestionResponse, TemplateMergeRequest, TemplateMergeResponse
-from ..services.hub_service import HubService
+from fastapi import APIRouter, HTTPException, Form, Depends, Response
+from ..models.templates import (
+    SuggestionRequest, SuggestionResponse, TemplateMergeRequest, TemplateMergeResponse,
+    TemplateMergeBatchRequest, TemplateMergeBatchResponse
+)
+from ..services.template_store import LOCAL_TEMPLATES, TEMPLATE_INDEX, read_template, template_variables
 from typing import Optional
-import re
+import asyncio
+import logging
+import orjson
+import os
 
 router = APIRouter()
-hub_service = HubService()
+logger = logging.getLogger(__name__)
 
-# Define LOCAL_TEMPLATES directly to avoid import issues
-LOCAL_TEMPLATES = {
-    "hwchase17/react-chat": """Thought: {thought}
-Action: {action}
-Observation: {observation}
+# Shared hub service instance, created on first request
+_hub_service = None
 
-... (repeat until task is solved)
+def get_hub_service():
+    """Return the shared HubService, creating it on first use."""
+    global _hub_service
+    if _hub_service is None:
+        from ..services.hub_service import HubService
+        _hub_service = HubService()
+    return _hub_service
 
-Final Answer: {final_answer}""",
+# Template contents are loaded lazily from disk; only the slug/variable index is read at import
+_LOCAL_TEMPLATE_KEYS = tuple(LOCAL_TEMPLATES.keys())
+_LOCAL_TEMPLATE_KEYS_JOINED = ", ".join(_LOCAL_TEMPLATE_KEYS)
 
-    "rlm/rag-prompt": """Use the following pieces of context to answer the question at the end.
-
-Context:
-{context}
-
-Question: {question}
-
-Helpful Answer:""",
-
-    "hwchase17/react-json": """Thought: {thought}
-Action: {action}
-Observation: {observation}
-
-... (repeat as needed)
-
-Final Answer: {final_answer}""",
-
-    "rlm/rag-prompt-cot": """Use the following pieces of context to answer the question at the end. Let's think step by step.
-
-Context:
-{context}
-
-Question: {question}
-
-Step by step reasoning:
-1. {step1}
-2. {step2}
-3. {step3}
-
-Final Answer:""",
-
-    "langchain-ai/retrieval-qa-chat": """You are an AI assistant helping answer questions based on provided context.
-
-Context:
-{context}
-
-Question: {question}
-
-Please provide a helpful and accurate answer based on the context above.""",
-
-    "hwchase17/react": """Question: {question}
-
-Thought: {thought}
-Action: {action}
-Observation: {observation}
-
-Final Answer: {answer}""",
-
-    "chain_of_thought": """Let's solve this step by step:
-
-1. First, understand the problem
-2. Break it down into smaller parts
-3. Work through each part systematically
-4. Combine the results
-
-Question: {question}
-
-Answer: {answer}""",
-
-    "few_shot": """Here are some examples:
-
-Example 1:
-Input: {example1_input}
-Output: {example1_output}
-
-Example 2:
-Input: {example2_input}
-Output: {example2_output}
-
-Now solve this:
-Input: {input}
-Output:""",
-
-    "role_prompting": """You are a {role} with expertise in {domain}.
-
-Task: {task}
-
-Instructions: {instructions}
-
-Please provide your response:"""
-}
-
-@router.post("/templates/suggest", response_model=SuggestionResponse, tags=["Templates"])
+# The response is serialized directly with orjson; SuggestionResponse only documents the schema
+@router.post("/templates/suggest", responses={200: {"model": SuggestionResponse}}, tags=["Templates"])
 async def suggest_templates(request: SuggestionRequest):
     """
     Suggests LangChain Hub templates based on detected prompt patterns.
     """
     try:
-        suggestions = hub_service.get_suggestions(request.patterns)
-        return SuggestionResponse(suggestions=suggestions)
+        suggestions = get_hub_service().get_suggestions(request.patterns)
+        return Response(content=orjson.dumps({"suggestions": suggestions}), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -116,7 +46,8 @@ async def merge_template(
     template_slug: str = Form(...),
     provider: str = Form("ollama"),
     model: str = Form("gemma:2b"),
-    api_key: str = Form("")
+    api_key: str = Form(""),
+    hub_service = Depends(get_hub_service)
 ):
     """
     Intelligently merge user prompt content into a selected template.
@@ -133,30 +64,54 @@ async def merge_template(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/templates/merge/batch", response_model=TemplateMergeBatchResponse, tags=["Templates"])
+async def merge_templates_batch(request: TemplateMergeBatchRequest, hub_service = Depends(get_hub_service)):
+    """
+    Merge several prompts and templates, batching them into as few LLM calls as possible.
+    """
+    try:
+        merged_templates = await asyncio.to_thread(
+            hub_service.merge_templates_batch,
+            user_prompts=request.user_prompts,
+            template_slugs=request.template_slugs,
+            provider=request.provider,
+            model=request.model,
+            api_key=request.api_key
+        )
+        return TemplateMergeBatchResponse(merged_templates=merged_templates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/templates/content/{template_slug:path}", tags=["Templates"])
 async def get_template_content(template_slug: str):
     """
     Get the content and metadata of a specific template.
     """
-    print(f"🚀 TEMPLATE ENDPOINT CALLED for: {template_slug}")
-    print(f"📋 Available templates: {list(LOCAL_TEMPLATES.keys())}")
+    logger.debug("Template endpoint called for: %s", template_slug)
+    logger.debug("Available templates: %s", _LOCAL_TEMPLATE_KEYS_JOINED)
 
     # Direct template access - this should work
-    if template_slug in LOCAL_TEMPLATES:
-        print(f"✅ FOUND {template_slug} in LOCAL_TEMPLATES!")
-        content = LOCAL_TEMPLATES[template_slug]
-        variables = set(re.findall(r'\{([^}]+)\}', content))
+    if template_slug in TEMPLATE_INDEX:
+        logger.debug("Found %s in LOCAL_TEMPLATES", template_slug)
+        variables = template_variables(template_slug)
         return {
-            "content": content,
-            "variables": list(variables),
+            "content": read_template(template_slug),
+            "variables": variables,
             "slug": template_slug,
             "variable_count": len(variables)
         }
     else:
-        print(f"❌ {template_slug} NOT FOUND in LOCAL_TEMPLATES")
+        logger.debug("%s not found in LOCAL_TEMPLATES, trying LangSmith through HubService", template_slug)
+        # HubService caches LangSmith templates and refreshes them once they are an hour old
+        metadata = await asyncio.to_thread(get_hub_service().get_remote_template_with_metadata, template_slug)
+        if metadata is not None:
+            return metadata
+
         # Return a fallback response instead of 404
         return {
-            "content": f"Template '{template_slug}' not found. Available templates: {', '.join(LOCAL_TEMPLATES.keys())}",
+            "content": f"Template '{template_slug}' not found. Available templates: {_LOCAL_TEMPLATE_KEYS_JOINED}",
             "variables": ["input"],
             "slug": template_slug,
             "variable_count": 1,
@@ -170,5 +125,12 @@ async def test_templates():
     return {
         "status": "ok",
         "message": "Templates router is working",
-        "available_templates": list(LOCAL_TEMPLATES.keys())
-    }
\ No newline at end of file
+        "available_templates": _LOCAL_TEMPLATE_KEYS
+    }
+
+
+if os.environ.get("PROMPT_STUDIO_DEBUG") == "1":
+    @router.get("/debug/cache", tags=["Debug"])
+    async def cache_stats():
+        """Template and suggestion cache statistics (only served in debug mode)."""
+        return get_hub_service().cache_stats()
@@ -1,24 +1,105 @@
-import dspy
-import pandas as pd
-import io
+import asyncio
+import codecs
+import csv
+import hashlib
+import importlib.util
 import json
-import tiktoken
+import logging
 import os
-from typing import List, Dict, Any
-
-# 1. Define signatures for different tasks
-class BasicQASignature(dspy.Signature):
-    """Answer the question."""
-    question = dspy.InputField()
-    answer = dspy.OutputField()
-
-class QualityJudgeSignature(dspy.Signature):
-    """Evaluate answer quality using LLM-as-a-Judge."""
-    question = dspy.InputField()
-    generated_answer = dspy.InputField()
-    ground_truth_answer = dspy.InputField()
-    quality_score = dspy.OutputField(desc="Quality score from 1-5")
-    feedback = dspy.OutputField(desc="Constructive feedback on the answer quality")
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# dspy and tiktoken are heavy imports; they are loaded inside the
+# methods that need them so routes that never optimize never pay for them.
+
+# Maximum number of concurrent LLM requests when bootstrapping demos
+LLM_CONCURRENCY = int(os.getenv("PROMPT_STUDIO_LLM_CONCURRENCY", "32"))
+# Retries per LLM request on transient provider errors (rate limits, timeouts)
+LLM_NUM_RETRIES = 3
+# Worker threads evaluating A/B test examples in parallel
+AB_TEST_MAX_WORKERS = 16
+
+# Probe for litellm without importing it; demos are bootstrapped through it directly when present
+LITELLM_AVAILABLE = importlib.util.find_spec("litellm") is not None
+
+def _supports_async_bootstrap(llm) -> bool:
+    """Whether demos can be bootstrapped with async litellm calls, using the LM's routing info."""
+    return LITELLM_AVAILABLE and hasattr(llm, "model") and hasattr(llm, "kwargs")
+
+# 1. Define signatures for different tasks (built on first use, once dspy is loaded)
+@lru_cache(maxsize=None)
+def _get_signature():
+    """Return the BasicQASignature class."""
+    import dspy
+
+    class BasicQASignature(dspy.Signature):
+        """Answer the question."""
+        question = dspy.InputField()
+        answer = dspy.OutputField()
+
+    return BasicQASignature
+
+@lru_cache(maxsize=None)
+def _get_judge_signature():
+    """Return the QualityJudgeSignature class."""
+    import dspy
+
+    class QualityJudgeSignature(dspy.Signature):
+        """Evaluate answer quality using LLM-as-a-Judge."""
+        question = dspy.InputField()
+        generated_answer = dspy.InputField()
+        ground_truth_answer = dspy.InputField()
+        quality_score = dspy.OutputField(desc="Quality score from 1-5")
+        feedback = dspy.OutputField(desc="Constructive feedback on the answer quality")
+
+    return QualityJudgeSignature
+
+@lru_cache(maxsize=None)
+def _get_qa_program():
+    """Return the QAProgram module class, which answers questions under given instructions."""
+    import dspy
+
+    class QAProgram(dspy.Module):
+        def __init__(self, instructions: str):
+            super().__init__()
+            self.predictor = dspy.Predict(_get_signature(), instructions=instructions)
+
+        def forward(self, question):
+            return self.predictor(question=question)
+
+    return QAProgram
+
+def _load_dataset(file: BinaryIO, filename: str) -> Tuple[List[Any], List[Any]]:
+    """Parse an uploaded CSV or JSONL dataset into parallel question and answer columns."""
+    questions, answers = [], []
+    if filename.endswith('.csv'):
+        # A codecs reader only needs read()/readline(), which SpooledTemporaryFile uploads
+        # provide on every supported Python (TextIOWrapper also needs readable() before 3.11).
+        # It is left unclosed so the underlying upload file stays open for its owner.
+        reader = csv.reader(codecs.getreader('utf-8-sig')(file))
+        header = next(reader, [])
+        if 'question' not in header or 'answer' not in header:
+            raise ValueError("Dataset must contain 'question' and 'answer' columns")
+        q_idx, a_idx = header.index('question'), header.index('answer')
+        min_columns = max(q_idx, a_idx) + 1
+        for row in reader:
+            # Skip blank and incomplete rows
+            if len(row) >= min_columns:
+                questions.append(row[q_idx])
+                answers.append(row[a_idx])
+    elif filename.endswith('.jsonl'):
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                questions.append(record['question'])
+                answers.append(record['answer'])
+    else:
+        raise ValueError("Unsupported file type. Please use .csv or .jsonl")
+    return questions, answers
 
 # Model pricing information (per 1K tokens)
 MODEL_PRICING = {
@@ -50,12 +131,32 @@ MODEL_PRICING = {
     }
 }
 
+# Configured LM instances keyed by (provider, model, sha256(api_key)), so requests
+# reuse an LM (and its pooled HTTP connections) instead of building a new one
+_LM_CACHE = {}
+_LM_CACHE_MAXSIZE = 64
+_LM_CACHE_LOCK = threading.Lock()
+
 class DspyService:
     def configure_llm(self, provider: str, model: str, api_key: str = ""):
         """Configures the DSPy LLM based on the selected provider."""
         # Try to get API key from environment variables first, then use provided key
         actual_api_key = api_key or self._get_api_key_for_provider(provider)
 
+        key = (provider, model, hashlib.sha256((actual_api_key or "").encode()).hexdigest())
+        with _LM_CACHE_LOCK:
+            llm = _LM_CACHE.get(key)
+            if llm is None:
+                llm = self._build_llm(provider, model, actual_api_key)
+                if len(_LM_CACHE) >= _LM_CACHE_MAXSIZE:
+                    _LM_CACHE.pop(next(iter(_LM_CACHE)))
+                _LM_CACHE[key] = llm
+        return llm
+
+    def _build_llm(self, provider: str, model: str, actual_api_key: str):
+        """Create a new DSPy LM for the provider."""
+        import dspy
+
         if provider == "ollama":
             # For Ollama, use LiteLLM format with provider prefix
             llm = dspy.LM(model=f"ollama/{model}", max_tokens=1000, api_base='http://localhost:11434', api_key='')
@@ -110,6 +211,8 @@ class DspyService:
         Returns:
             Quality score between 0.0 and 1.0
         """
+        import dspy
+
         try:
             # Configure LLM if not already configured
             if not hasattr(self, '_current_llm') or self._current_llm is None:
@@ -120,7 +223,7 @@ class DspyService:
             with dspy.context(lm=self._current_llm):
                 try:
                     # Create the judge program
-                    judge_program = dspy.Predict(QualityJudgeSignature)
+                    judge_program = dspy.Predict(_get_judge_signature())
 
                     # Get LLM evaluation
                     result = judge_program(
@@ -165,6 +268,8 @@ class DspyService:
             Estimated token count
         """
         try:
+            import tiktoken
+
             # Map model names to appropriate encodings
             encoding_map = {
                 "gpt-3.5-turbo": "cl100k_base",
@@ -206,13 +311,13 @@ class DspyService:
             # Return default pricing if model not found
             return {"input": 0.002, "output": 0.002}
 
-    def estimate_optimization_cost(self, file_content: bytes, filename: str,
+    def estimate_optimization_cost(self, file: BinaryIO, filename: str,
                                  provider: str, model: str, max_iterations: int = 4) -> Dict[str, Any]:
         """
         Estimate the cost of running prompt optimization.
 
         Args:
-            file_content: The dataset file content
+            file: The dataset file object
             filename: Name of the file (for format detection)
             provider: LLM provider
             model: Model name
@@ -223,29 +328,19 @@ class DspyService:
         """
         try:
             # Load and parse dataset
-            if filename.endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file_content))
-            elif filename.endswith('.jsonl'):
-                df = pd.read_json(io.BytesIO(file_content), lines=True)
-            else:
-                raise ValueError("Unsupported file type. Please use .csv or .jsonl")
+            questions, answers = _load_dataset(file, filename)
 
-            if df.empty:
+            if not questions:
                 return {"error": "Dataset is empty"}
 
             # Calculate token counts
-            total_examples = len(df)
+            total_examples = len(questions)
             total_prompt_tokens = 0
             total_example_tokens = 0
 
             # Sample a few examples to estimate average token count
             sample_size = min(10, total_examples)
-            sample_df = df.head(sample_size)
-
-            for _, row in sample_df.iterrows():
-                question = str(row.get('question', ''))
-                answer = str(row.get('answer', ''))
-
+            for question, answer in zip(questions[:sample_size], answers[:sample_size]):
                 # Estimate tokens for examples
                 example_text = f"Question: {question}\nAnswer: {answer}"
                 example_tokens = self.estimate_tokens(example_text, model)
@@ -287,95 +382,165 @@ class DspyService:
         except Exception as e:
             return {"error": f"Cost estimation failed: {str(e)}"}
 
-    def optimize_prompt(self, original_prompt: str, file_content: bytes, filename: str,
-                       provider: str, model: str, api_key: str, metric: str = "exact_match",
-                       max_iterations: int = 4) -> str:
-          # 1. Configure the LLM for this specific request
-        llm = self.configure_llm(provider, model, api_key)
+    def _get_metric(self, metric: str):
+        """Return a DSPy-style metric function (example, pred, trace=None) for the metric name."""
+        import dspy
 
-        # 2. Load the dataset
-        if filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(file_content))
-        elif filename.endswith('.jsonl'):
-            df = pd.read_json(io.BytesIO(file_content), lines=True)
-        else:
-            raise ValueError("Unsupported file type. Please use .csv or .jsonl")
-        
-        train_set = [dspy.Example(question=row['question'], answer=row['answer']).with_inputs('question') for _, row in df.iterrows()]
+        if metric == "llm_as_a_judge":
+            # Use LLM-as-a-Judge metric for qualitative evaluation
+            def llm_judge_metric(example, pred, trace=None):
+                return self.llm_as_a_judge_metric(pred.answer, example.answer, example.question)
+            return llm_judge_metric
 
-        # 2. Define the program to optimize
-        class BasicQAProgram(dspy.Module):
-            def __init__(self):
-                super().__init__()
-                self.predictor = dspy.Predict(BasicQASignature, instructions=original_prompt)
+        # Default to exact match metric
+        return dspy.evaluate.answer_exact_match
 
-            def forward(self, question):
-                return self.predictor(question=question)
+    async def _abootstrap_demos(self, llm, instructions: str, train_set: list, metric_fn,
+                                max_demos: int) -> list:
+        """
+        Bootstrap few-shot demos by answering training questions concurrently.
 
-        # 3. Set up the optimizer with the selected metric and guardrails using dspy.context
+        Follows BootstrapFewShot: examples whose generated answer passes the metric
+        become demos (with the generated answer), and any remaining slots are filled
+        with labeled examples. Requests go out in waves sized from the demos still
+        needed (twice that, capped at LLM_CONCURRENCY), and the run stops as soon as
+        enough demos have passed, so it spends about as many calls as BootstrapFewShot.
+        """
+        import dspy
+        import litellm
+
+        completion_kwargs = {**llm.kwargs, "num_retries": LLM_NUM_RETRIES}
+        semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+        async def generate_answer(example) -> str:
+            async with semaphore:
+                response = await litellm.acompletion(
+                    model=llm.model,
+                    messages=[
+                        {"role": "system", "content": instructions},
+                        {"role": "user", "content": f"Question: {example.question}\nAnswer:"},
+                    ],
+                    **completion_kwargs
+                )
+            return (response.choices[0].message.content or "").strip()
+
+        bootstrapped = {}  # train_set index -> demo with the generated answer
+        errors = []
+        metric_errors = []
+        answered = 0
+        start = 0
+        while start < len(train_set) and (needed := max_demos - len(bootstrapped)) > 0:
+            # Some answers fail the metric, so ask for a few more than needed, within the concurrency cap
+            wave = min(LLM_CONCURRENCY, needed * 2)
+            batch = list(enumerate(train_set[start:start + wave], start))
+            start += wave
+            answers = await asyncio.gather(*(generate_answer(ex) for _, ex in batch), return_exceptions=True)
+
+            candidates = []
+            for (i, example), answer in zip(batch, answers):
+                if isinstance(answer, Exception):
+                    errors.append(answer)
+                else:
+                    candidates.append((i, example, answer))
+            answered += len(candidates)
+
+            # Metrics may call an LLM themselves (LLM-as-a-Judge), so score the batch concurrently too
+            scores = await asyncio.gather(*(
+                asyncio.to_thread(metric_fn, example, dspy.Prediction(answer=answer))
+                for _, example, answer in candidates
+            ), return_exceptions=True)
+            for (i, example, answer), score in zip(candidates, scores):
+                if isinstance(score, Exception):
+                    # A failed metric call counts as a failed score for that example only
+                    metric_errors.append(score)
+                elif score and len(bootstrapped) < max_demos:
+                    bootstrapped[i] = dspy.Example(question=example.question, answer=answer).with_inputs('question')
+
+        if errors and not answered:
+            # Every request failed (bad key, unreachable provider...), surface the cause
+            raise errors[0]
+        if errors:
+            logger.warning("%d bootstrap request(s) failed, first error: %s", len(errors), errors[0])
+        if metric_errors:
+            logger.warning("%d metric call(s) failed, first error: %s", len(metric_errors), metric_errors[0])
+
+        labeled = [ex for i, ex in enumerate(train_set) if i not in bootstrapped]
+        return list(bootstrapped.values()) + labeled[:max(0, max_demos - len(bootstrapped))]
+
+    def _compile_demos(self, llm, instructions: str, train_set: list, metric_fn, max_demos: int) -> list:
+        """Bootstrap demos with DSPy's own BootstrapFewShot teleprompter."""
+        import dspy
         from dspy.teleprompt import BootstrapFewShot
+        QAProgram = _get_qa_program()
 
+        config = dict(max_bootstrapped_demos=max_demos, max_labeled_demos=max_demos)
         try:
             with dspy.context(lm=llm):
-                if metric == "llm_as_a_judge":
-                    # Use LLM-as-a-Judge metric for qualitative evaluation
-                    def llm_judge_metric(example, pred, trace=None):
-                        question = example.question
-                        ground_truth = example.answer
-                        generated_answer = pred.answer
-                        return self.llm_as_a_judge_metric(generated_answer, ground_truth, question)
-
-                    config = dict(max_bootstrapped_demos=max_iterations, max_labeled_demos=max_iterations)
-                    teleprompter = BootstrapFewShot(metric=llm_judge_metric, **config)
-                else:
-                    # Default to exact match metric
-                    config = dict(max_bootstrapped_demos=max_iterations, max_labeled_demos=max_iterations)
-                    teleprompter = BootstrapFewShot(metric=dspy.evaluate.answer_exact_match, **config)
-
-                optimized_program = teleprompter.compile(BasicQAProgram(), trainset=train_set)
+                teleprompter = BootstrapFewShot(metric=metric_fn, **config)
+                return teleprompter.compile(QAProgram(instructions), trainset=train_set).predictor.demos
 
         except (AttributeError, TypeError) as e:
             if "OpenAI" in str(e) or "context" in str(e) or "Predict" in str(e):
                 print(f"DSPy compatibility issue: {e}")
                 print("Falling back to basic optimization...")
-                # Fallback: use a simpler approach without context manager
+                # Fallback: use a simpler approach without context manager, exact match only
                 try:
-                    if metric == "llm_as_a_judge":
-                        # For now, fall back to exact match if LLM judge fails
-                        config = dict(max_bootstrapped_demos=max_iterations, max_labeled_demos=max_iterations)
-                        teleprompter = BootstrapFewShot(metric=dspy.evaluate.answer_exact_match, **config)
-                    else:
-                        config = dict(max_bootstrapped_demos=max_iterations, max_labeled_demos=max_iterations)
-                        teleprompter = BootstrapFewShot(metric=dspy.evaluate.answer_exact_match, **config)
-
-                    optimized_program = teleprompter.compile(BasicQAProgram(), trainset=train_set)
+                    teleprompter = BootstrapFewShot(metric=dspy.evaluate.answer_exact_match, **config)
+                    return teleprompter.compile(QAProgram(instructions), trainset=train_set).predictor.demos
                 except Exception as fallback_error:
                     print(f"Fallback optimization also failed: {fallback_error}")
-                    # Last resort: return original prompt with minimal examples
-                    example_string = ""
-                    for i, example in enumerate(trainset[:2]):  # Just 2 examples
-                        example_string += f"Example {i+1}:\nQuestion: {example.question}\nAnswer: {example.answer}\n\n"
-
-                    optimized_prompt = f"{original_prompt}\n\n--- Examples ---\n{example_string}"
-                    return optimized_prompt
+                    # Last resort: use the first labeled examples as-is
+                    return train_set[:2]
             else:
                 raise
 
-        # 4. Retrieve the learned demonstrations from the optimized predictor
-        demos = optimized_program.predictor.demos
-        
-        # Format the demos into a human-readable string
-        example_string = ""
-        for demo in demos:
-            example_string += f"Question: {demo.question}\n"
-            example_string += f"Answer: {demo.answer}\n\n"
-            
+    async def aoptimize_prompt(self, original_prompt: str, file: BinaryIO, filename: str,
+                               provider: str, model: str, api_key: str, metric: str = "exact_match",
+                               max_iterations: int = 4) -> str:
+        import dspy
+
+        # 1. Configure the LLM for this specific request
+        llm = self.configure_llm(provider, model, api_key)
+
+        # 2. Load the dataset
+        questions, answers = _load_dataset(file, filename)
+        train_set = [dspy.Example(question=q, answer=a).with_inputs('question') for q, a in zip(questions, answers)]
+
+        # 3. Bootstrap demos with the selected metric and guardrails
+        metric_fn = self._get_metric(metric)
+        if _supports_async_bootstrap(llm):
+            demos = await self._abootstrap_demos(llm, original_prompt, train_set, metric_fn, max_iterations)
+        else:
+            # LM objects without litellm routing info (older DSPy clients) go through the teleprompter
+            logger.warning("Async bootstrapping unavailable, falling back to BootstrapFewShot")
+            demos = await asyncio.to_thread(
+                self._compile_demos, llm, original_prompt, train_set, metric_fn, max_iterations
+            )
+
+        # 4. Format the demos into a human-readable string
+        example_string = "".join(f"Question: {demo.question}\nAnswer: {demo.answer}\n\n" for demo in demos)
+
         # The new "optimized prompt" is the original instruction plus the learned examples
         optimized_prompt = f"{original_prompt}\n\n--- Examples ---\n{example_string}"
 
         return optimized_prompt
 
-    def run_ab_test(self, prompt_a: str, prompt_b: str, file_content: bytes, filename: str,
+    def optimize_prompt(self, original_prompt: str, file: BinaryIO, filename: str,
+                       provider: str, model: str, api_key: str, metric: str = "exact_match",
+                       max_iterations: int = 4) -> str:
+        """Synchronous entry point for aoptimize_prompt."""
+        return asyncio.run(self.aoptimize_prompt(
+            original_prompt=original_prompt,
+            file=file,
+            filename=filename,
+            provider=provider,
+            model=model,
+            api_key=api_key,
+            metric=metric,
+            max_iterations=max_iterations
+        ))
+
+    def run_ab_test(self, prompt_a: str, prompt_b: str, file: BinaryIO, filename: str,
                    provider: str, model: str, api_key: str, metric: str = "exact_match") -> Dict[str, Any]:
         """
         Run A/B test comparison between two prompts using a provided dataset.
@@ -383,7 +548,7 @@ class DspyService:
         Args:
             prompt_a: First prompt to test
             prompt_b: Second prompt to test
-            file_content: Dataset file content
+            file: Dataset file object
             filename: Name of the file (for format detection)
             provider: LLM provider
             model: Model name
@@ -393,94 +558,73 @@ class DspyService:
         Returns:
             Dictionary containing detailed results and summary statistics
         """
+        import dspy
+
         # 1. Configure the LLM
         llm = self.configure_llm(provider, model, api_key)
 
         # 2. Load and parse the dataset
-        if filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(file_content))
-        elif filename.endswith('.jsonl'):
-            df = pd.read_json(io.BytesIO(file_content), lines=True)
-        else:
-            raise ValueError("Unsupported file type. Please use .csv or .jsonl")
+        questions, answers = _load_dataset(file, filename)
 
-        if df.empty:
+        if not questions:
             raise ValueError("Dataset is empty")
 
         # Convert to DSPy examples
-        examples = [dspy.Example(question=row['question'], answer=row['answer']).with_inputs('question')
-                   for _, row in df.iterrows()]
+        examples = [dspy.Example(question=q, answer=a).with_inputs('question')
+                   for q, a in zip(questions, answers)]
 
         # 3. Set up evaluation metric
-        if metric == "llm_as_a_judge":
-            def evaluation_metric(example, pred, trace=None):
-                question = example.question
-                ground_truth = example.answer
-                generated_answer = pred.answer
-                return self.llm_as_a_judge_metric(generated_answer, ground_truth, question)
-        else:
-            evaluation_metric = dspy.evaluate.answer_exact_match
+        evaluation_metric = self._get_metric(metric)
 
         # 4. Create programs for both prompts
-        class PromptAProgram(dspy.Module):
-            def __init__(self):
-                super().__init__()
-                self.predictor = dspy.Predict(BasicQASignature, instructions=prompt_a)
-
-            def forward(self, question):
-                return self.predictor(question=question)
-
-        class PromptBProgram(dspy.Module):
-            def __init__(self):
-                super().__init__()
-                self.predictor = dspy.Predict(BasicQASignature, instructions=prompt_b)
-
-            def forward(self, question):
-                return self.predictor(question=question)
+        QAProgram = _get_qa_program()
+        program_a = QAProgram(prompt_a)
+        program_b = QAProgram(prompt_b)
 
         # 5. Run evaluation loop
-        detailed_results = []
+        def evaluate_example(i, example):
+            try:
+                # dspy.context is thread-local, so each worker sets its own LM
+                with dspy.context(lm=llm):
+                    # Generate answer with Prompt A
+                    result_a = program_a(question=example.question)
+                    answer_a = result_a.answer
+
+                    # Generate answer with Prompt B
+                    result_b = program_b(question=example.question)
+                    answer_b = result_b.answer
+
+                    # Evaluate both answers
+                    score_a = evaluation_metric(example, result_a)
+                    score_b = evaluation_metric(example, result_b)
+
+                # Store detailed results
+                return {
+                    "question": example.question,
+                    "expected_answer": example.answer,
+                    "prompt_a_answer": answer_a,
+                    "prompt_b_answer": answer_b,
+                    "prompt_a_score": score_a,
+                    "prompt_b_score": score_b
+                }
+
+            except Exception as e:
+                print(f"Error evaluating example {i}: {e}")
+                # Add error result with neutral scores
+                return {
+                    "question": example.question,
+                    "expected_answer": example.answer,
+                    "prompt_a_answer": "ERROR",
+                    "prompt_b_answer": "ERROR",
+                    "prompt_a_score": 0.5,
+                    "prompt_b_score": 0.5,
+                    "error": str(e)
+                }
 
         try:
-            with dspy.context(lm=llm):
-                for i, example in enumerate(examples):
-                    try:
-                        # Generate answer with Prompt A
-                        program_a = PromptAProgram()
-                        result_a = program_a(question=example.question)
-                        answer_a = result_a.answer
-
-                        # Generate answer with Prompt B
-                        program_b = PromptBProgram()
-                        result_b = program_b(question=example.question)
-                        answer_b = result_b.answer
-
-                        # Evaluate both answers
-                        score_a = evaluation_metric(example, result_a)
-                        score_b = evaluation_metric(example, result_b)
-
-                        # Store detailed results
-                        detailed_results.append({
-                            "question": example.question,
-                            "expected_answer": example.answer,
-                            "prompt_a_answer": answer_a,
-                            "prompt_b_answer": answer_b,
-                            "prompt_a_score": score_a,
-                            "prompt_b_score": score_b
-                        })
-
-                    except Exception as e:
-                        print(f"Error evaluating example {i}: {e}")
-                        # Add error result with neutral scores
-                        detailed_results.append({
-                            "question": example.question,
-                            "expected_answer": example.answer,
-                            "prompt_a_answer": "ERROR",
-                            "prompt_b_answer": "ERROR",
-                            "prompt_a_score": 0.5,
-                            "prompt_b_score": 0.5,
-                            "error": str(e)
-                        })
+            # LLM calls are network-bound, so threads overlap them despite the GIL
+            with ThreadPoolExecutor(max_workers=min(AB_TEST_MAX_WORKERS, len(examples))) as pool:
+                detailed_results = list(pool.map(evaluate_example, range(len(examples)), examples))
 
         except Exception as e:
             print(f"DSPy context error: {e}")
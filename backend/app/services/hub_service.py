@@ -1,162 +1,449 @@
-# LangChain Hub has moved to LangSmith - using LangSmith Client
-try:
-    from langsmith import Client
-    LANGSMITH_AVAILABLE = True
-except ImportError:
-    LANGSMITH_AVAILABLE = False
-    print("LangSmith not available, using fallback templates")
-
 from ..models.analysis import PatternMatch
-from typing import List, Dict
+from collections import OrderedDict, defaultdict
+import contextlib
+from functools import lru_cache
+import importlib.util
+from operator import itemgetter
+from typing import List, Dict, Optional, Tuple
+import logging
+import hashlib
+import heapq
+import math
 import re
-import dspy
-from ..services.dspy_service import DspyService
+import stat
+import sys
+import tempfile
+import threading
+import time
+from ..services.template_store import LOCAL_TEMPLATES, read_template, template_variables
+from pathlib import Path
 import os
 
-# Local template repository with popular LangSmith templates
-LOCAL_TEMPLATES = {
-    "hwchase17/react-chat": """Thought: {thought}
-Action: {action}
-Observation: {observation}
-
-... (repeat until task is solved)
-
-Final Answer: {final_answer}""",
-
-    "rlm/rag-prompt": """Use the following pieces of context to answer the question at the end.
-
-Context:
-{context}
-
-Question: {question}
-
-Helpful Answer:""",
-
-    "hwchase17/react-json": """Thought: {thought}
-Action: {action}
-Observation: {observation}
-
-... (repeat as needed)
-
-Final Answer: {final_answer}""",
-
-    "rlm/rag-prompt-cot": """Use the following pieces of context to answer the question at the end. Let's think step by step.
-
-Context:
-{context}
-
-Question: {question}
-
-Step by step reasoning:
-1. {step1}
-2. {step2}
-3. {step3}
-
-Final Answer:""",
+logger = logging.getLogger(__name__)
 
-    "langchain-ai/retrieval-qa-chat": """You are an AI assistant helping answer questions based on provided context.
-
-Context:
-{context}
-
-Question: {question}
-
-Please provide a helpful and accurate answer based on the context above.""",
-
-    "hwchase17/react": """Question: {question}
-
-Thought: {thought}
-Action: {action}
-Observation: {observation}
-
-Final Answer: {answer}""",
-
-    "chain_of_thought": """Let's solve this step by step:
-
-1. First, understand the problem
-2. Break it down into smaller parts
-3. Work through each part systematically
-4. Combine the results
-
-Question: {question}
+# Optional: Aho-Corasick automata for validating merged templates
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# LangChain Hub has moved to LangSmith - using LangSmith Client.
+# Probe for the package without importing it; Client is imported on first fetch.
+LANGSMITH_AVAILABLE = importlib.util.find_spec("langsmith") is not None
+if not LANGSMITH_AVAILABLE:
+    logger.info("LangSmith not available, using fallback templates")
+
+# Read once; the environment (including .env files) is loaded before this module is imported
+_LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
+
+_LANGSMITH_CLIENT = None
+_LANGSMITH_CLIENT_LOCK = threading.Lock()
+
+def _get_langsmith_client():
+    """Return the shared LangSmith Client, creating it on first use.
+
+    The client keeps a pooled HTTP session, so reusing it avoids a new
+    TCP/TLS handshake for every template fetch.
+    """
+    global _LANGSMITH_CLIENT
+    if _LANGSMITH_CLIENT is None:
+        with _LANGSMITH_CLIENT_LOCK:
+            if _LANGSMITH_CLIENT is None:
+                from langsmith import Client
+                _LANGSMITH_CLIENT = Client()
+    return _LANGSMITH_CLIENT
 
-Answer: {answer}""",
+# This maps our internal pattern names to popular LangSmith prompts.
+# Updated to use LangSmith format: "owner/repo-name"
+PATTERN_TO_HUB_MAP = {
+     "rag": ("rlm/rag-prompt", "langchain-ai/retrieval-qa-chat"),
+     "react": ("hwchase17/react-chat", "hwchase17/react-json"),
+     "chain_of_thought": ("rlm/rag-prompt-cot", "chain_of_thought"),
+     "role_prompting": ("hwchase17/react-chat", "rlm/rag-prompt"),
+ }
+# Pattern names and slugs are hot dict keys; interning them makes probes identity compares.
+PATTERN_TO_HUB_MAP = {
+    sys.intern(pattern): tuple(sys.intern(slug) for slug in slugs)
+    for pattern, slugs in PATTERN_TO_HUB_MAP.items()
+}
 
-    "few_shot": """Here are some examples:
+def _trigrams(text: str) -> frozenset:
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+# Local slugs in lookup order, and trigram -> positions of the local slugs containing it.
+# A slug can only contain another if all trigrams of the shorter one occur in the longer,
+# so the index narrows the candidates before the actual containment check.
+_SIMILAR_SLUGS = tuple(LOCAL_TEMPLATES)
+_SIMILAR_SLUG_TRIGRAMS = tuple(_trigrams(slug) for slug in _SIMILAR_SLUGS)
+_TRIGRAM_INDEX = defaultdict(list)
+for _position, _slug_trigrams in enumerate(_SIMILAR_SLUG_TRIGRAMS):
+    for _trigram in _slug_trigrams:
+        _TRIGRAM_INDEX[_trigram].append(_position)
+# Slugs too short to have trigrams are always candidates
+_SHORT_SLUG_POSITIONS = [i for i, slug_trigrams in enumerate(_SIMILAR_SLUG_TRIGRAMS) if not slug_trigrams]
+
+def _find_similar_slug(template_slug: str) -> Optional[str]:
+    """
+    Return the first local slug, in LOCAL_TEMPLATES order, that contains template_slug
+    or is contained in it; None if there is none.
+    """
+    query_trigrams = _trigrams(template_slug)
+    if query_trigrams:
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in _TRIGRAM_INDEX.get(trigram, ()):
+                shared[position] += 1
+        positions = sorted([
+            position for position, count in shared.items()
+            if count == len(query_trigrams) or count == len(_SIMILAR_SLUG_TRIGRAMS[position])
+        ] + _SHORT_SLUG_POSITIONS)
+    else:
+        positions = range(len(_SIMILAR_SLUGS))
+
+    for position in positions:
+        existing_slug = _SIMILAR_SLUGS[position]
+        if template_slug in existing_slug or existing_slug in template_slug:
+            return existing_slug
+    return None
+
+class _LRU:
+    """Thread-safe bounded cache that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def info(self) -> Dict[str, int]:
+        """Hit/miss statistics, shaped like functools.lru_cache's cache_info()."""
+        return {"hits": self.hits, "misses": self.misses, "maxsize": self.maxsize, "currsize": len(self._data)}
+
+# LangSmith template cache: slug -> (content, fetched_at as time.time())
+TEMPLATE_CACHE = _LRU(maxsize=512)
+
+# Template metadata (content + extracted variables) cache, keyed by (slug, content)
+METADATA_CACHE = _LRU(maxsize=256)
+
+# Slugs whose LangSmith fetch failed recently -> time of the failure (time.monotonic()).
+# Lookups skip LangSmith for these until the TTL passes instead of waiting on it again.
+LANGSMITH_FAILURE_CACHE = _LRU(maxsize=512)
+LANGSMITH_FAILURE_TTL = 300
+
+def _langsmith_recently_failed(template_slug: str) -> bool:
+    failed_at = LANGSMITH_FAILURE_CACHE.get(template_slug)
+    return failed_at is not None and time.monotonic() - failed_at < LANGSMITH_FAILURE_TTL
+
+# Age (seconds) after which a LangSmith template is pulled again on its next use;
+# if that pull fails, the older copy keeps being served
+TEMPLATE_REFRESH_AFTER = 3600
+
+# On-disk copies of LangSmith templates, shared by workers and kept across restarts
+TEMPLATE_DISK_CACHE_DIR = Path(os.getenv(
+    "PROMPT_STUDIO_TEMPLATE_CACHE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "prompt_studio")
+))
+TEMPLATE_DISK_CACHE_TTL = 86400
+
+@lru_cache(maxsize=None)
+def _disk_cache_dir() -> Optional[Path]:
+    """
+    Create the template disk cache directory if needed and return it, or None if it is
+    not safe to use: owned by another user, or writable by group or others.
+    """
+    try:
+        TEMPLATE_DISK_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = TEMPLATE_DISK_CACHE_DIR.stat()
+    except OSError as e:
+        logger.warning("Template disk cache disabled, cannot create %s: %s", TEMPLATE_DISK_CACHE_DIR, e)
+        return None
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        logger.warning("Template disk cache disabled, %s is owned by another user", TEMPLATE_DISK_CACHE_DIR)
+        return None
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.warning("Template disk cache disabled, %s is writable by other users", TEMPLATE_DISK_CACHE_DIR)
+        return None
+    return TEMPLATE_DISK_CACHE_DIR
+
+def _disk_cache_path(template_slug: str) -> Optional[Path]:
+    cache_dir = _disk_cache_dir()
+    if cache_dir is None:
+        return None
+    return cache_dir / (hashlib.sha256(template_slug.encode()).hexdigest() + ".txt")
+
+def _read_disk_cache(template_slug: str) -> Optional[Tuple[str, float]]:
+    """Return the cached template content and its fetch time, or None if missing or expired."""
+    path = _disk_cache_path(template_slug)
+    if path is None:
+        return None
+    try:
+        fetched_at = path.stat().st_mtime
+        if time.time() - fetched_at > TEMPLATE_DISK_CACHE_TTL:
+            return None
+        return path.read_text(encoding="utf-8"), fetched_at
+    except OSError:
+        return None
+
+def _write_disk_cache(template_slug: str, content: str):
+    path = _disk_cache_path(template_slug)
+    if path is None:
+        return
+    tmp_path = None
+    try:
+        # Write to a uniquely named file first so readers and concurrent writers,
+        # in this process or another, never see a partial template
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if tmp_path is not None:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+        logger.warning("Failed to write template %s to disk cache: %s", template_slug, e)
+
+# Template variables such as {question} or {context}
+_VAR_RE = re.compile(r'\{([^}]+)\}')
+
+@lru_cache(maxsize=None)
+def _local_template_metadata(template_slug: str) -> Dict:
+    """
+    Metadata for a local template, using the variables precomputed in its index.
+    Shared between callers; hand out copies made with _copy_metadata.
+    """
+    variables = template_variables(template_slug)
+    return {
+        "content": read_template(template_slug),
+        "variables": tuple(variables) if variables else ("input",),
+        "slug": template_slug,
+        "variable_count": len(variables) if variables else 1
+    }
+
+def _copy_metadata(metadata: Dict) -> Dict:
+    """Copy of cached template metadata that callers are free to modify."""
+    return {**metadata, "variables": list(metadata["variables"])}
+
+# Scaffolding of the single-template LLM merge prompt, filled with str.format_map
+_MERGE_PROMPT_TEMPLATE = """
+You are an expert prompt engineer. Given the user's prompt and a template with variables, intelligently extract information from the user's prompt and fill in the template variables.
 
-Example 1:
-Input: {example1_input}
-Output: {example1_output}
+**User's Prompt:**
+{user_prompt}
 
-Example 2:
-Input: {example2_input}
-Output: {example2_output}
+**Template:**
+{template_content}
 
-Now solve this:
-Input: {input}
-Output:""",
+**Variables to fill:** {variables_str}
 
-    "role_prompting": """You are a {role} with expertise in {domain}.
+**Instructions:**
+1. Analyze the user's prompt to understand its intent, context, and key elements
+2. For each variable in the template, determine what content from the user's prompt should fill it
+3. If a variable doesn't have a clear mapping, use your best judgment to infer appropriate content
+4. Return only the completed template with variables filled in
+5. Maintain the template's structure and formatting
 
-Task: {task}
+**Response Format:**
+Return only the filled-in template text, no explanations or additional content.
+"""
 
-Instructions: {instructions}
+# Scaffolding of the batched merge prompt; each case is rendered with _MERGE_BATCH_CASE_TEMPLATE
+_MERGE_BATCH_PROMPT_TEMPLATE = """
+You are an expert prompt engineer. For each case below, given the user's prompt and a template with variables, intelligently extract information from the user's prompt and fill in the template variables.
 
-Please provide your response:"""
-}
+{cases_str}
+**Instructions:**
+1. Analyze each user's prompt to understand its intent, context, and key elements
+2. For each variable in a case's template, determine what content from that case's prompt should fill it
+3. If a variable doesn't have a clear mapping, use your best judgment to infer appropriate content
+4. Maintain each template's structure and formatting
+5. Answer every case, writing its completed template between a "### BEGIN n ###" line and an "### END n ###" line, where n is the case number
 
-# This maps our internal pattern names to popular LangSmith prompts.
-# Updated to use LangSmith format: "owner/repo-name"
-PATTERN_TO_HUB_MAP = {
-     "rag": ["rlm/rag-prompt", "langchain-ai/retrieval-qa-chat"],
-     "react": ["hwchase17/react-chat", "hwchase17/react-json"],
-     "chain_of_thought": ["rlm/rag-prompt-cot", "chain_of_thought"],
-     "role_prompting": ["hwchase17/react-chat", "rlm/rag-prompt"],
- }
+**Response Format:**
+Return only the delimited filled-in templates, no explanations or additional content.
+"""
 
-# Template content cache for better performance
-TEMPLATE_CACHE = {}
+_MERGE_BATCH_CASE_TEMPLATE = """### CASE {n} ###
+**User's Prompt:**
+{user_prompt}
 
-class HubService:
-    def get_suggestions(self, detected_patterns: Dict[str, PatternMatch]) -> List[dict]:
-        if not detected_patterns:
-            return []
+**Template:**
+{template_content}
 
-        # Find all unique template names suggested by the detected patterns
-        suggested_slugs = set()
-        for pattern_name in detected_patterns.keys():
-            if pattern_name in PATTERN_TO_HUB_MAP:
-                for slug in PATTERN_TO_HUB_MAP[pattern_name]:
-                    suggested_slugs.add(slug)
+**Variables to fill:** {variables_str}
+"""
 
-        # Calculate the total confidence score of all detected patterns
-        total_confidence = sum(p.confidence for p in detected_patterns.values())
-        if total_confidence == 0:
+@lru_cache(maxsize=None)
+def _get_merge_signature():
+    """Return the TemplateMergeSignature class, defined on first use so dspy loads lazily."""
+    import dspy
+
+    # Create a simple signature for template merging
+    class TemplateMergeSignature(dspy.Signature):
+        """Merge user prompt into template."""
+        merge_prompt = dspy.InputField()
+        merged_template = dspy.OutputField(desc="The template with variables filled in")
+
+    return TemplateMergeSignature
+
+@lru_cache(maxsize=None)
+def _get_merge_batch_signature():
+    """Return the TemplateMergeBatchSignature class."""
+    import dspy
+
+    class TemplateMergeBatchSignature(dspy.Signature):
+        """Merge each user prompt into its template."""
+        merge_prompt = dspy.InputField()
+        merged_templates = dspy.OutputField(
+            desc="Each filled-in template between ### BEGIN n ### and ### END n ### lines"
+        )
+
+    return TemplateMergeBatchSignature
+
+@lru_cache(maxsize=256)
+def _variables_matcher(variables: Tuple[str, ...]):
+    """Return a function telling whether a text mentions any of the variables, in one scan."""
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for var in variables:
+            automaton.add_word(var, var)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+
+    variables_re = re.compile("|".join(re.escape(var) for var in variables))
+    return lambda text: variables_re.search(text) is not None
+
+def _is_valid_merge(merged_content: str, variables: List[str]) -> bool:
+    """Basic validation that an LLM merge produced a reasonable response."""
+    return len(merged_content) > 10 and _variables_matcher(tuple(variables))(merged_content)
+
+# Number of prompt/template pairs merged per LLM call; batch prompting keeps
+# answer quality flat for small batches
+MERGE_BATCH_SIZE = 4
+
+# One case of a batched merge response: ### BEGIN n ### ... ### END n ###
+_BATCH_CASE_RE = re.compile(r'### BEGIN (\d+) ###\s*(.*?)\s*### END \1 ###', re.DOTALL)
+
+class _FillMap(dict):
+    """
+    Variable values for the simple merge fallback.
+
+    Variables without an explicit value get generic content from __missing__,
+    up to max_generic of them; any others are left as-is in the template.
+    """
+
+    def __init__(self, values: Dict[str, str], user_prompt: str, max_generic: int = 3):
+        super().__init__(values)
+        self._prompt = user_prompt
+        self._generic_left = max_generic
+
+    def __missing__(self, var: str):
+        value = None
+        if self._generic_left > 0:
+            self._generic_left -= 1
+            # Use parts of the user prompt or generic content
+            if var.lower() in ("instruction", "task", "query"):
+                value = self._prompt[:100]
+            elif var.lower() in ("answer", "response", "output"):
+                value = "[Answer will be generated based on the above]"
+            else:
+                value = f"[Content for {var}]"
+        self[var] = value
+        return value
+
+    def substitute(self, match: re.Match) -> str:
+        """re.sub callback for _VAR_RE matches."""
+        value = self[match.group(1)]
+        return match.group(0) if value is None else value
+
+def _rank_suggestions(key: Tuple[Tuple[str, float], ...], top_k: Optional[int]) -> List[dict]:
+    """Rank templates from (pattern_name, confidence) pairs, keeping the top_k best if given."""
+    if not key:
+        return []
+
+    if len(key) == 1:
+        # A single detected pattern scores 100 on every template it maps to
+        (pattern_name, confidence), = key
+        if not confidence > 0:
             return []
+        return [{"name": slug, "score": 100.0} for slug in PATTERN_TO_HUB_MAP.get(pattern_name, ())][:top_k]
+
+    # Calculate the total confidence score of all detected patterns
+    total_confidence = math.fsum(confidence for _, confidence in key)
+    if not total_confidence > 0:
+        return []
+
+    # Single pass: each detected pattern adds its confidence to every template it suggests.
+    # For now, we assume the template exists. A real implementation might check this.
+    slug_confidence = defaultdict(float)
+    for pattern_name, confidence in key:
+        for slug in PATTERN_TO_HUB_MAP.get(pattern_name, ()):
+            slug_confidence[slug] += confidence
+
+    # Calculate score using the approved formula
+    scale = 100.0 / total_confidence
+    if len(slug_confidence) <= 1:
+        # Nothing to rank. Patterns without templates still count towards the total,
+        # so a lone template does not necessarily score 100.
+        return [
+            {"name": slug, "score": round(confidence * scale, 2)}
+            for slug, confidence in slug_confidence.items()
+        ][:top_k]
+
+    ranked_suggestions = (
+        {"name": slug, "score": round(confidence * scale, 2)}
+        for slug, confidence in slug_confidence.items()
+    )
+
+    # Order suggestions from highest score to lowest
+    if top_k is not None:
+        return heapq.nlargest(top_k, ranked_suggestions, key=itemgetter("score"))
+    return sorted(ranked_suggestions, key=itemgetter("score"), reverse=True)
+
+@lru_cache(maxsize=512)
+def _get_suggestions_cached(signature: Tuple[Tuple[str, float], ...], top_k: Optional[int]) -> Tuple[dict, ...]:
+    """
+    Ranked suggestions for a sorted (pattern_name, confidence) signature, kept for repeat queries.
+    The suggestion dicts are shared between callers; hand out copies.
+    """
+    return tuple(_rank_suggestions(signature, top_k))
 
-        # Score each unique template
-        ranked_suggestions = []
-        for slug in suggested_slugs:
-            # For now, we assume the template exists. A real implementation might check this.
-            # We determine which of our patterns are associated with this slug.
-            matched_pattern_names = {
-                p_name for p_name, s_list in PATTERN_TO_HUB_MAP.items() if slug in s_list
-            }
-
-            # Sum the confidences of only the patterns that were detected AND match this slug
-            matched_confidence = sum(
-                p.confidence for name, p in detected_patterns.items() if name in matched_pattern_names
-            )
-
-            # Calculate score using the approved formula
-            score = (matched_confidence / total_confidence) * 100
-            
-            ranked_suggestions.append({"name": slug, "score": round(score, 2)})
-
-        # Sort suggestions from highest score to lowest
-        ranked_suggestions.sort(key=lambda x: x["score"], reverse=True)
+class HubService:
+    def get_suggestions(self, detected_patterns: Dict[str, PatternMatch],
+                        top_k: Optional[int] = None) -> List[dict]:
+        # Equivalent pattern sets share one cached ranking regardless of dict order
+        signature = tuple(sorted((name, p.confidence) for name, p in detected_patterns.items()))
+        return self.get_suggestions_from_key(signature, top_k)
+
+    def get_suggestions_from_key(self, key: Tuple[Tuple[str, float], ...],
+                                 top_k: Optional[int] = None) -> List[dict]:
+        """
+        Rank templates from sorted (pattern_name, confidence) pairs.
 
-        return ranked_suggestions
+        Rankings are cached per key, so repeated inputs are served without re-ranking.
+        With top_k, only the k highest-scoring suggestions are returned.
+        """
+        return [dict(suggestion) for suggestion in _get_suggestions_cached(key, top_k)]
 
     def get_template_content(self, template_slug: str) -> str:
         """
@@ -168,71 +455,114 @@ class HubService:
         Returns:
             The template content as a string
         """
-        print(f"🔍 Looking for template: {template_slug}")
-        print(f"📋 Available templates: {list(LOCAL_TEMPLATES.keys())}")
-
-        if template_slug in TEMPLATE_CACHE:
-            print(f"✅ Found {template_slug} in cache")
-            return TEMPLATE_CACHE[template_slug]
+        logger.debug("🔍 Looking for template: %s", template_slug)
 
-        # Try to fetch from LangSmith if available
-        if LANGSMITH_AVAILABLE:
-            try:
-                # Check if LangSmith API key is available
-                langsmith_api_key = os.getenv("LANGSMITH_API_KEY")
-                if not langsmith_api_key:
-                    print("LangSmith API key not found in environment variables, using local templates")
-                else:
-                    print(f"Attempting to fetch {template_slug} from LangSmith...")
-                    client = Client()
-                    prompt = client.pull_prompt(template_slug)
-                    content = str(prompt)
-                    print(f"Successfully fetched {template_slug} from LangSmith")
-
-                    # Cache the template content
-                    TEMPLATE_CACHE[template_slug] = content
-                    return content
-
-            except Exception as e:
-                print(f"Failed to fetch template {template_slug} from LangSmith: {e}")
-                print("Using local templates as fallback")
+        content = self._get_langsmith_content(template_slug)
+        if content is not None:
+            return content
 
         # Use local template repository as fallback
-        print(f"🔍 Checking LOCAL_TEMPLATES for: {template_slug}")
+        logger.debug("🔍 Checking LOCAL_TEMPLATES for: %s", template_slug)
         if template_slug in LOCAL_TEMPLATES:
             content = LOCAL_TEMPLATES[template_slug]
-            TEMPLATE_CACHE[template_slug] = content
-            print(f"✅ Found template {template_slug} in LOCAL_TEMPLATES")
+            logger.debug("✅ Found template %s in LOCAL_TEMPLATES", template_slug)
             return content
         else:
-            print(f"❌ Template {template_slug} NOT found in LOCAL_TEMPLATES")
+            logger.debug("❌ Template %s NOT found in LOCAL_TEMPLATES", template_slug)
 
         # Fallback for pattern-based template names
         if template_slug == "chain_of_thought":
             content = LOCAL_TEMPLATES["chain_of_thought"]
-            TEMPLATE_CACHE[template_slug] = content
-            print(f"Using chain_of_thought template")
+            logger.debug("Using chain_of_thought template")
             return content
 
         # Try to find similar templates
-        print(f"🔍 Looking for similar templates to: {template_slug}")
-        for existing_slug in LOCAL_TEMPLATES.keys():
-            if template_slug in existing_slug or existing_slug in template_slug:
-                content = LOCAL_TEMPLATES[existing_slug]
-                TEMPLATE_CACHE[template_slug] = content
-                print(f"✅ Using similar template {existing_slug} for {template_slug}")
-                return content
+        logger.debug("🔍 Looking for similar templates to: %s", template_slug)
+        existing_slug = _find_similar_slug(template_slug)
+        if existing_slug:
+            content = LOCAL_TEMPLATES[existing_slug]
+            logger.debug("✅ Using similar template %s for %s", existing_slug, template_slug)
+            return content
 
         # Generic fallback for unknown templates
-        print(f"❌ Template {template_slug} not found, using generic template")
+        logger.debug("❌ Template %s not found, using generic template", template_slug)
         generic_content = f"""Template: {template_slug}
 
 {{input}}
 
 [Template content not available]"""
-        TEMPLATE_CACHE[template_slug] = generic_content
         return generic_content
 
+    def _get_langsmith_content(self, template_slug: str) -> Optional[str]:
+        """
+        Return a template pulled from LangSmith, served from memory or disk while younger than
+        TEMPLATE_REFRESH_AFTER. None if LangSmith is not configured or has no copy of it.
+        """
+        if not LANGSMITH_AVAILABLE:
+            return None
+        if not _LANGSMITH_API_KEY:
+            logger.debug("LangSmith API key not found in environment variables, using local templates")
+            return None
+
+        cached = TEMPLATE_CACHE.get(template_slug)
+        if cached is None and (cached := _read_disk_cache(template_slug)) is not None:
+            logger.debug("✅ Found %s in disk cache", template_slug)
+            TEMPLATE_CACHE.put(template_slug, cached)
+        if cached is not None and time.time() - cached[1] < TEMPLATE_REFRESH_AFTER:
+            logger.debug("✅ Found %s in cache", template_slug)
+            return cached[0]
+        stale = cached[0] if cached is not None else None
+
+        if _langsmith_recently_failed(template_slug):
+            logger.debug("Skipping LangSmith for %s after a recent failure", template_slug)
+            return stale
+
+        try:
+            logger.debug("Attempting to fetch %s from LangSmith...", template_slug)
+            prompt = _get_langsmith_client().pull_prompt(template_slug)
+            content = str(prompt)
+        except Exception as e:
+            LANGSMITH_FAILURE_CACHE.put(template_slug, time.monotonic())
+            if stale is not None:
+                logger.warning("Failed to refresh template %s from LangSmith, serving the cached copy: %s", template_slug, e)
+            else:
+                logger.warning("Failed to fetch template %s from LangSmith, using local templates: %s", template_slug, e)
+            return stale
+
+        logger.debug("Successfully fetched %s from LangSmith", template_slug)
+        TEMPLATE_CACHE.put(template_slug, (content, time.time()))
+        _write_disk_cache(template_slug, content)
+        return content
+
+    def _content_metadata(self, template_slug: str, content: str) -> Dict:
+        """Metadata for dynamically resolved content, cached until the content changes."""
+        key = (template_slug, content)
+        metadata = METADATA_CACHE.get(key)
+        if metadata is None:
+            # Extract variables (common patterns like {variable}, {{variable}}, etc.)
+            # dict.fromkeys dedups while keeping first-appearance order
+            variables = tuple(dict.fromkeys(_VAR_RE.findall(content)))
+            metadata = {
+                "content": content,
+                "variables": variables if variables else ("input",),
+                "slug": template_slug,
+                "variable_count": len(variables) if variables else 1
+            }
+            METADATA_CACHE.put(key, metadata)
+        return _copy_metadata(metadata)
+
+    def get_remote_template_with_metadata(self, template_slug: str) -> Optional[Dict]:
+        """
+        Get a template and its metadata from LangSmith only, without local fallbacks.
+
+        Returns:
+            Dictionary with template content and metadata, or None if LangSmith cannot provide it
+        """
+        content = self._get_langsmith_content(template_slug)
+        if content is None:
+            return None
+        return self._content_metadata(template_slug, content)
+
     def get_template_with_metadata(self, template_slug: str) -> Dict:
         """
         Get template content along with metadata like variables found.
@@ -243,6 +573,10 @@ class HubService:
         Returns:
             Dictionary with template content and metadata
         """
+        # Local templates are served as-is unless LangSmith would be tried first
+        if template_slug in LOCAL_TEMPLATES and not (LANGSMITH_AVAILABLE and _LANGSMITH_API_KEY):
+            return _copy_metadata(_local_template_metadata(template_slug))
+
         content = self.get_template_content(template_slug)
 
         if not content:
@@ -255,14 +589,20 @@ class HubService:
                 "error": "Template content not available, using placeholder"
             }
 
-        # Extract variables (common patterns like {variable}, {{variable}}, etc.)
-        variables = set(re.findall(r'\{([^}]+)\}', content))
+        # LangSmith was tried but the lookup fell back to the local copy, whose variables are indexed
+        if template_slug in LOCAL_TEMPLATES and content == read_template(template_slug):
+            return _copy_metadata(_local_template_metadata(template_slug))
+
+        return self._content_metadata(template_slug, content)
 
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Size and hit statistics of the template and suggestion caches."""
         return {
-            "content": content,
-            "variables": list(variables) if variables else ["input"],
-            "slug": template_slug,
-            "variable_count": len(variables) if variables else 1
+            "template_content": TEMPLATE_CACHE.info(),
+            "template_metadata": METADATA_CACHE.info(),
+            "langsmith_failures": LANGSMITH_FAILURE_CACHE.info(),
+            "local_template_metadata": _local_template_metadata.cache_info()._asdict(),
+            "suggestions": _get_suggestions_cached.cache_info()._asdict(),
         }
 
     def merge_template_with_prompt(self, user_prompt: str, template_slug: str,
@@ -293,6 +633,10 @@ class HubService:
             # Try LLM-based merging first
             if provider != "ollama" or api_key:  # Only try LLM if not using default ollama
                 try:
+                    # Imported here so suggestions and template lookups never load dspy
+                    import dspy
+                    from ..services.dspy_service import DspyService
+
                     # Configure LLM for merging
                     dspy_service = DspyService()
                     llm = dspy_service.configure_llm(provider, model, api_key)
@@ -300,37 +644,15 @@ class HubService:
                     # Create merging prompt
                     variables_str = ", ".join(f'"{var}"' for var in variables)
 
-                    merge_prompt = f"""
-You are an expert prompt engineer. Given the user's prompt and a template with variables, intelligently extract information from the user's prompt and fill in the template variables.
-
-**User's Prompt:**
-{user_prompt}
-
-**Template:**
-{template_content}
-
-**Variables to fill:** {variables_str}
-
-**Instructions:**
-1. Analyze the user's prompt to understand its intent, context, and key elements
-2. For each variable in the template, determine what content from the user's prompt should fill it
-3. If a variable doesn't have a clear mapping, use your best judgment to infer appropriate content
-4. Return only the completed template with variables filled in
-5. Maintain the template's structure and formatting
-
-**Response Format:**
-Return only the filled-in template text, no explanations or additional content.
-"""
+                    merge_prompt = _MERGE_PROMPT_TEMPLATE.format_map({
+                        "user_prompt": user_prompt,
+                        "template_content": template_content,
+                        "variables_str": variables_str
+                    })
 
                     # Use DSPy to get LLM response
                     with dspy.context(lm=llm):
-                        # Create a simple signature for template merging
-                        class TemplateMergeSignature(dspy.Signature):
-                            """Merge user prompt into template."""
-                            merge_prompt = dspy.InputField()
-                            merged_template = dspy.OutputField(desc="The template with variables filled in")
-
-                        merge_program = dspy.Predict(TemplateMergeSignature)
+                        merge_program = dspy.Predict(_get_merge_signature())
                         response = merge_program(merge_prompt=merge_prompt)
 
                         # Check if response is valid
@@ -338,44 +660,117 @@ Return only the filled-in template text, no explanations or additional content.
                             merged_content = response.merged_template.strip()
 
                             # Basic validation - ensure we got a reasonable response
-                            if len(merged_content) > 10 and any(var in merged_content for var in variables):
-                                print(f"Successfully merged template with {len(merged_content)} characters")
+                            if _is_valid_merge(merged_content, variables):
+                                logger.debug("Successfully merged template with %d characters", len(merged_content))
                                 return merged_content
                             else:
-                                print(f"LLM template merging produced poor result (length: {len(merged_content)}), using fallback")
+                                logger.info("LLM template merging produced poor result (length: %d), using fallback", len(merged_content))
                         else:
-                            print(f"LLM template merging returned None or empty response: {response}, using fallback")
+                            logger.info("LLM template merging returned None or empty response: %s, using fallback", response)
 
                 except Exception as e:
-                    print(f"LLM template merging failed: {e}, using fallback method")
+                    logger.warning("LLM template merging failed: %s, using fallback method", e)
 
             # Fallback: Simple string replacement method
-            print("Using simple string replacement fallback for template merging")
-            merged_content = template_content
-
-            # Simple fallback: try to fill common variables with prompt content
-            if "{question}" in template_content and len(user_prompt) > 10:
-                merged_content = merged_content.replace("{question}", user_prompt[:200] + "..." if len(user_prompt) > 200 else user_prompt)
-            if "{input}" in template_content:
-                merged_content = merged_content.replace("{input}", user_prompt)
-            if "{context}" in template_content and len(user_prompt) > 50:
-                merged_content = merged_content.replace("{context}", user_prompt)
-
-            # If we still have unfilled variables, try to fill them with generic content
-            remaining_variables = [var for var in variables if "{" + var + "}" in merged_content]
-            for var in remaining_variables[:3]:  # Fill up to 3 remaining variables
-                if "{" + var + "}" in merged_content:
-                    # Use parts of the user prompt or generic content
-                    if var.lower() in ["instruction", "task", "query"]:
-                        merged_content = merged_content.replace("{" + var + "}", user_prompt[:100])
-                    elif var.lower() in ["answer", "response", "output"]:
-                        merged_content = merged_content.replace("{" + var + "}", "[Answer will be generated based on the above]")
-                    else:
-                        merged_content = merged_content.replace("{" + var + "}", f"[Content for {var}]")
-
-            print(f"Fallback template merging completed with {len(merged_content)} characters")
-            return merged_content
+            return self._fallback_merge(user_prompt, template_content)
 
         except Exception as e:
-            print(f"Template merging error: {e}")
-            return user_prompt
\ No newline at end of file
+            logger.error("Template merging error: %s", e)
+            return user_prompt
+
+    def _fallback_merge(self, user_prompt: str, template_content: str) -> str:
+        """Fill template variables with the user prompt or generic content, without an LLM."""
+        logger.debug("Using simple string replacement fallback for template merging")
+        # Fill common variables with prompt content in a single pass over the template
+        mapping = _FillMap({"input": user_prompt}, user_prompt)
+        if len(user_prompt) > 10:
+            mapping["question"] = user_prompt[:200] + "..." if len(user_prompt) > 200 else user_prompt
+        if len(user_prompt) > 50:
+            mapping["context"] = user_prompt
+        merged_content = _VAR_RE.sub(mapping.substitute, template_content)
+
+        logger.debug("Fallback template merging completed with %d characters", len(merged_content))
+        return merged_content
+
+    def merge_templates_batch(self, user_prompts: List[str], template_slugs: List[str],
+                              provider: str = "ollama", model: str = "gemma:2b", api_key: str = "") -> List[str]:
+        """
+        Merge several prompt/template pairs, packing up to MERGE_BATCH_SIZE of them
+        into each LLM call so the shared instructions are only sent once per batch.
+
+        A single prompt is merged into every template, and a single template is
+        filled from every prompt; otherwise the two lists are paired in order.
+        Pairs the LLM skips or answers poorly use the simple replacement fallback.
+
+        Args:
+            user_prompts: The user's prompts
+            template_slugs: The templates to merge into
+            provider: LLM provider for merging
+            model: Model for merging
+            api_key: API key if required
+
+        Returns:
+            The merged templates, in input order
+        """
+        if len(user_prompts) == 1:
+            user_prompts = user_prompts * len(template_slugs)
+        elif len(template_slugs) == 1:
+            template_slugs = template_slugs * len(user_prompts)
+        if len(user_prompts) != len(template_slugs):
+            raise ValueError("user_prompts and template_slugs must have the same length")
+
+        # Return the original prompt where a template is not available
+        results = list(user_prompts)
+        cases = []
+        for i, (user_prompt, template_slug) in enumerate(zip(user_prompts, template_slugs)):
+            template_info = self.get_template_with_metadata(template_slug)
+            if template_info["content"] and template_info["variables"]:
+                cases.append((i, user_prompt, template_info["content"], template_info["variables"]))
+
+        merged = {}
+        if cases and (provider != "ollama" or api_key):  # Only try LLM if not using default ollama
+            try:
+                from ..services.dspy_service import DspyService
+
+                llm = DspyService().configure_llm(provider, model, api_key)
+                for start in range(0, len(cases), MERGE_BATCH_SIZE):
+                    try:
+                        merged.update(self._merge_batch_with_llm(llm, cases[start:start + MERGE_BATCH_SIZE]))
+                    except Exception as e:
+                        logger.warning("LLM batch template merging failed: %s, using fallback method", e)
+            except Exception as e:
+                logger.warning("LLM batch template merging failed: %s, using fallback method", e)
+
+        for i, user_prompt, template_content, _ in cases:
+            results[i] = merged[i] if i in merged else self._fallback_merge(user_prompt, template_content)
+        return results
+
+    def _merge_batch_with_llm(self, llm, cases: list) -> Dict[int, str]:
+        """Merge a batch of (index, user_prompt, template_content, variables) cases in one LLM call."""
+        import dspy
+
+        cases_str = "\n".join(
+            _MERGE_BATCH_CASE_TEMPLATE.format_map({
+                "n": n,
+                "user_prompt": user_prompt,
+                "template_content": template_content,
+                "variables_str": ", ".join(f'"{var}"' for var in variables)
+            })
+            for n, (_, user_prompt, template_content, variables) in enumerate(cases, 1)
+        )
+        merge_prompt = _MERGE_BATCH_PROMPT_TEMPLATE.format_map({"cases_str": cases_str})
+
+        with dspy.context(lm=llm):
+            response = dspy.Predict(_get_merge_batch_signature())(merge_prompt=merge_prompt)
+
+        merged = {}
+        for match in _BATCH_CASE_RE.finditer(getattr(response, "merged_templates", None) or ""):
+            n = int(match.group(1))
+            if 1 <= n <= len(cases):
+                index, _, _, variables = cases[n - 1]
+                merged_content = match.group(2).strip()
+                if _is_valid_merge(merged_content, variables):
+                    merged[index] = merged_content
+
+        logger.debug("Batch merged %d of %d templates with one LLM call", len(merged), len(cases))
+        return merged
@@ -1,12 +1,361 @@
+import hashlib
+import math
 import re
-from typing import List, Dict, Tuple
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import json
-import dspy
-from ..services.dspy_service import DspyService
+import orjson
 
 from ..models.analysis import PatternMatch
 
+# Optional: a single Aho-Corasick pass finds every literal keyword of every pattern
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Outermost {...} block of an LLM response, ignoring code fences or prose around it
+_JSON_BLOCK_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# Keywords without any of these characters are plain literals
+_REGEX_META_RE = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+# Each keyword hit adds this much confidence (capped at 1.0); at most MAX_EVIDENCE hits are quoted
+KEYWORD_HIT_CONFIDENCE = 0.35
+MAX_EVIDENCE = 3
+# Hits after which confidence is 1.0 and a pattern's remaining keywords need not be scanned
+SATURATING_HITS = math.ceil(1.0 / KEYWORD_HIT_CONFIDENCE)
+
+# The 11 confidence bars for 0-10 filled tenths, built once
+_CONFIDENCE_BARS = tuple("█" * filled + "░" * (10 - filled) for filled in range(11))
+
+# Number of recent prompts whose detection results are kept
+DETECTION_CACHE_SIZE = 256
+
+# Order in which categories are reported
+CATEGORY_ORDER = ('Basic', 'Reasoning', 'Agent', 'Retrieval', 'Control', 'Meta', 'Multimodal', 'Analysis')
+
+# Pattern definitions: keywords are regexes matched against the lowercased prompt
+_PATTERNS: Dict[str, dict] = {
+    # Basic Patterns
+    'zero_shot': {
+        'keywords': [],
+        'negative_keywords': [r'example', r'for instance', r'like this'],
+        'description': 'Direct task without examples',
+        'category': 'Basic'
+    },
+    'few_shot': {
+        'keywords': [r'here are examples', r'example:', r'for instance', 
+                   r'like this:', r'sample:', r'input:.*output:'],
+        'description': 'Provides examples before the task',
+        'category': 'Basic'
+    },
+    'role_prompting': {
+        'keywords': [r'you are a', r'act as', r'you are an', r'assume the role'],
+        'description': 'Assigns a specific role or persona',
+        'category': 'Basic'
+    },
+    
+    # Advanced Reasoning
+    'chain_of_thought': {
+        'keywords': [r'step by step', r'think through', r'reason about', 
+                   r"let\'s think", r'work through', r'explain your reasoning'],
+        'description': 'Encourages step-by-step reasoning (CoT)',
+        'category': 'Reasoning'
+    },
+    'self_consistency': {
+        'keywords': [r'multiple.*reasoning', r'different.*approaches', 
+                   r'various.*solutions', r'compare.*answers'],
+        'description': 'Generates multiple reasoning paths',
+        'category': 'Reasoning'
+    },
+    'tree_of_thoughts': {
+        'keywords': [r'explore.*options', r'branch.*possibilities', 
+                   r'different paths', r'evaluate.*alternatives'],
+        'description': 'Explores multiple reasoning branches (ToT)',
+        'category': 'Reasoning'
+    },
+    'generate_knowledge': {
+        'keywords': [r'first.*generate.*knowledge', r'what do you know about',
+                   r'provide background', r'recall.*information'],
+        'description': 'Generates relevant knowledge before answering',
+        'category': 'Reasoning'
+    },
+    
+    # Agent Patterns
+    'react': {
+        'keywords': [r'thought:', r'action:', r'observation:', 
+                   r'reason.*then.*act', r'plan.*execute'],
+        'description': 'Reasoning + Acting pattern (ReAct)',
+        'category': 'Agent'
+    },
+    'reflexion': {
+        'keywords': [r'reflect on', r'self-reflect', r'evaluate your',
+                   r'what went wrong', r'how to improve', r'self-assess',
+                   r'analyze.*performance', r'critique.*yourself',
+                   r'improve.*reasoning', r'better.*response',
+                   r'self-critique', r'critique your answer',
+                   r'review and critique',
+                   r'identify.*errors', r'logical.*errors'],
+        'description': 'AI self-reflection: AI evaluates its own outputs and performance',
+        'category': 'Agent'
+    },
+    'automatic_reasoning': {
+        'keywords': [r'use tools', r'available functions', r'call.*function',
+                   r'external tools'],
+        'description': 'Automatic Reasoning and Tool-use (ART)',
+        'category': 'Agent'
+    },
+    
+    # Retrieval & Context
+    'rag': {
+        'keywords': [r'based on.*context', r'using.*document', r'retrieve',
+                   r'search.*then.*answer', r'given.*information'],
+        'description': 'Retrieval Augmented Generation (RAG)',
+        'category': 'Retrieval'
+    },
+    'active_prompt': {
+        'keywords': [r'most uncertain', r'need clarification', r'ask questions',
+                   r'what else.*need'],
+        'description': 'Actively seeks clarification',
+        'category': 'Retrieval'
+    },
+    
+    # Output Control
+    'directional_stimulus': {
+        'keywords': [r'focus on', r'emphasize', r'pay attention to',
+                   r'highlight', r'prioritize'],
+        'description': 'Guides attention to specific aspects',
+        'category': 'Control'
+    },
+    'constraint_setting': {
+        'keywords': [r'must include', r'do not', r'avoid', r'only',
+                   r'ensure that', r'specifically', r'focus on', r'focusing on'],
+        'description': 'Sets boundaries or requirements',
+        'category': 'Control'
+    },
+    'task_decomposition': {
+        'keywords': [r'review and critique', r'provide.*feedback', r'offer.*suggestions',
+                   r'break.*down', r'step by step', r'analyze.*then'],
+        'description': 'Breaks down complex tasks into specific components',
+        'category': 'Control'
+    },
+    'output_formatting': {
+        'keywords': [r'format', r'structure', r'provide in', r'output as',
+                   r'json', r'table', r'list', r'markdown'],
+        'description': 'Specifies desired output format',
+        'category': 'Control'
+    },
+    
+    # Meta Patterns
+    'meta_prompting': {
+        'keywords': [r'improve.*prompt', r'better.*question', r'rewrite.*query',
+                   r'optimize.*instruction'],
+        'description': 'Prompts about prompts',
+        'category': 'Meta'
+    },
+    'automatic_prompt_engineer': {
+        'keywords': [r'generate.*prompt', r'create.*instruction', 
+                   r'design.*template'],
+        'description': 'Automatic Prompt Engineering (APE)',
+        'category': 'Meta'
+    },
+    
+    # Multimodal
+    'multimodal_cot': {
+        'keywords': [r'analyze.*image', r'visual.*reasoning', r'describe.*then',
+                   r'based on.*picture'],
+        'description': 'Chain-of-Thought with multimodal inputs',
+        'category': 'Multimodal'
+    },
+    
+    # Traditional Patterns
+    'task_specification': {
+        'keywords': [r'generate', r'create', r'write', r'analyze', 
+                   r'review', r'explain', r'summarize'],
+        'description': 'Clearly defines the task',
+        'category': 'Basic'
+    },
+    'iterative_refinement': {
+        'keywords': [r'if.*feedback', r'refine', r'enhance', r'iterate',
+                   r'improve.*previous'],
+        'description': 'Includes feedback loop instructions',
+        'category': 'Control'
+    },
+    'persona_context': {
+        'keywords': [r'known for', r'expert in', r'specialized',
+                   r'with experience'],
+        'description': 'Adds context or credentials to the role',
+        'category': 'Basic'
+    },
+    'goal_oriented': {
+        'keywords': [r'goal', r'objective', r'aim', r'purpose',
+                   r'for maximum', r'to ensure'],
+        'description': 'Defines success criteria',
+        'category': 'Control'
+    },
+    'audience_awareness': {
+        'keywords': [r'audience', r'reader', r'for.*users', r'target'],
+        'description': 'Considers the end audience',
+        'category': 'Control'
+    },
+
+    # Content Analysis & Critique (Peer Review)
+    'peer_review': {
+        'keywords': [r'review.*tweet', r'critique.*content', r'feedback.*post',
+                   r'analyze.*writing', r'evaluate.*message', r'assess.*communication',
+                   r'content.*review', r'writing.*feedback', r'social.*media.*analysis',
+                   r'provide.*feedback', r'constructive.*criticism',
+                   r'review and critique', r'provide constructive feedback',
+                   r'offer specific suggestions', r'make.*compelling',
+                   r'enhancing.*depth', r'overall.*impact'],
+        'description': 'Content critique: AI analyzes and evaluates external content',
+        'category': 'Analysis'
+    }
+}
+
+# Keywords are matched against the lowercased prompt, so they are compiled without IGNORECASE
+_COMPILED_KEYWORDS: Dict[str, List[re.Pattern]] = {
+    name: [re.compile(keyword) for keyword in info['keywords']]
+    for name, info in _PATTERNS.items()
+}
+
+def _required_literal(keyword: str) -> Optional[str]:
+    """
+    Return a literal substring every match of the keyword contains (its longest fragment
+    between '.*'), or None if the keyword uses other regex syntax.
+    """
+    fragments = [re.sub(r'\\(\W)', r'\1', fragment) for fragment in keyword.split('.*')]
+    if any(_REGEX_META_RE.search(fragment) for fragment in fragments):
+        return None
+    return max(fragments, key=len) or None
+
+# The literal each keyword stands for, or None for keywords that need the regex engine
+_LITERAL_KEYWORDS: Dict[str, List[Optional[str]]] = {
+    name: [None if '.*' in keyword else _required_literal(keyword) for keyword in info['keywords']]
+    for name, info in _PATTERNS.items()
+}
+
+def _find_spans(text: str, literal: str):
+    """Yield the (start, end) spans of non-overlapping occurrences of a literal, like re.finditer."""
+    start = text.find(literal)
+    while start != -1:
+        end = start + len(literal)
+        yield start, end
+        start = text.find(literal, end)
+
+def _build_keyword_prefilter() -> Dict[str, Tuple[str, ...]]:
+    """
+    Map each pattern to literals of which at least one must occur in the prompt for any
+    of its keywords to match. Patterns with keywords that cannot be reduced are left out.
+    """
+    prefilter = {}
+    for name, info in _PATTERNS.items():
+        literals = [_required_literal(keyword) for keyword in info['keywords']]
+        if not literals or None in literals:
+            continue
+        # A literal containing a shorter one is redundant: the shorter one occurs whenever it does
+        literals = sorted(set(literals), key=len)
+        prefilter[name] = tuple(
+            literal for i, literal in enumerate(literals)
+            if not any(shorter in literal for shorter in literals[:i])
+        )
+    return prefilter
+
+# Cheap substring checks that rule out patterns before any of their keywords is scanned
+_KEYWORD_PREFILTER = _build_keyword_prefilter()
+
+def _build_literal_automaton():
+    """
+    Put the literal keywords of all patterns into one automaton, labelled with (pattern, keyword index).
+    Returns None without pyahocorasick; literal keywords are then found with str.find.
+    """
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for name, literals in _LITERAL_KEYWORDS.items():
+        for index, literal in enumerate(literals):
+            if literal is None:
+                continue
+            if literal not in automaton:
+                automaton.add_word(literal, (len(literal), []))
+            automaton.get(literal)[1].append((name, index))
+    automaton.make_automaton()
+    return automaton
+
+_LITERAL_AUTOMATON = _build_literal_automaton()
+
+# Bullet list of every pattern the refinement LLM may report; the pattern set is fixed
+_AVAILABLE_PATTERNS_STR = "\n".join(f"- {pattern}" for pattern in _PATTERNS)
+
+# Scaffolding of the LLM refinement meta-prompt, filled with str.format_map
+_REFINEMENT_META_PROMPT_TEMPLATE = """
+You are an expert prompt engineering analyst. Review the following prompt and the patterns detected by an automated system.
+
+**Original Prompt:**
+{original_prompt}
+
+**Automatically Detected Patterns:**
+{detected_str}
+
+**Available Pattern Types:**
+{available_patterns_str}
+
+**Your Task:**
+Review the original prompt and the detected patterns. Then:
+
+1. **Correct any mistakes** in the automated detection
+2. **Add any missing patterns** from the available list that should be detected
+3. **Remove patterns** that don't actually apply
+4. **Adjust confidence scores** (0.0-1.0) based on how well each pattern fits
+5. **Add evidence** for each pattern you include
+
+**Response Format:**
+You MUST respond with a JSON object in this EXACT format:
+{{
+    "patterns": {{
+        "zero_shot": {{
+            "confidence": 0.7,
+            "evidence": ["No clear examples found, suggesting a zero-shot approach."],
+            "description": "Direct task without examples",
+            "category": "Basic"
+        }},
+        "role_prompting": {{
+            "confidence": 0.9,
+            "evidence": ["You are a Twitter expert assigned to craft outstanding tweets."],
+            "description": "Assigns a specific role or persona",
+            "category": "Basic"
+        }}
+    }}
+}}
+
+**Guidelines:**
+- Only include patterns that are actually present in the prompt
+- Focus on the most relevant and confident patterns (aim for 3-8 patterns max)
+- Provide specific evidence from the prompt text
+- Be conservative with high confidence scores (0.8+ only for very clear matches)
+- Consider pattern interactions and hierarchies
+
+**Critical:** Respond ONLY with the JSON object, no explanations, no markdown formatting, no additional text.
+"""
+
+@lru_cache(maxsize=None)
+def _get_refinement_program():
+    """Return the Predict module used for LLM pattern refinement, built once on first use."""
+    import dspy
+
+    class PatternRefinementSignature(dspy.Signature):
+        """Refine prompt pattern detection results."""
+        meta_prompt = dspy.InputField()
+        refined_json = dspy.OutputField(desc="JSON object with refined pattern analysis")
+
+    return dspy.Predict(PatternRefinementSignature)
+
 class AdvancedPromptPatternDetector:
     """
     Detect prompt engineering patterns based on:
@@ -15,196 +364,62 @@ class AdvancedPromptPatternDetector:
     """
     
     def __init__(self):
-        self.patterns = {
-            # Basic Patterns
-            'zero_shot': {
-                'keywords': [],
-                'negative_keywords': [r'example', r'for instance', r'like this'],
-                'description': 'Direct task without examples',
-                'category': 'Basic'
-            },
-            'few_shot': {
-                'keywords': [r'here are examples', r'example:', r'for instance', 
-                           r'like this:', r'sample:', r'input:.*output:'],
-                'description': 'Provides examples before the task',
-                'category': 'Basic'
-            },
-            'role_prompting': {
-                'keywords': [r'you are a', r'act as', r'you are an', r'assume the role'],
-                'description': 'Assigns a specific role or persona',
-                'category': 'Basic'
-            },
-            
-            # Advanced Reasoning
-            'chain_of_thought': {
-                'keywords': [r'step by step', r'think through', r'reason about', 
-                           r"let\'s think", r'work through', r'explain your reasoning'],
-                'description': 'Encourages step-by-step reasoning (CoT)',
-                'category': 'Reasoning'
-            },
-            'self_consistency': {
-                'keywords': [r'multiple.*reasoning', r'different.*approaches', 
-                           r'various.*solutions', r'compare.*answers'],
-                'description': 'Generates multiple reasoning paths',
-                'category': 'Reasoning'
-            },
-            'tree_of_thoughts': {
-                'keywords': [r'explore.*options', r'branch.*possibilities', 
-                           r'different paths', r'evaluate.*alternatives'],
-                'description': 'Explores multiple reasoning branches (ToT)',
-                'category': 'Reasoning'
-            },
-            'generate_knowledge': {
-                'keywords': [r'first.*generate.*knowledge', r'what do you know about',
-                           r'provide background', r'recall.*information'],
-                'description': 'Generates relevant knowledge before answering',
-                'category': 'Reasoning'
-            },
-            
-            # Agent Patterns
-            'react': {
-                'keywords': [r'thought:', r'action:', r'observation:', 
-                           r'reason.*then.*act', r'plan.*execute'],
-                'description': 'Reasoning + Acting pattern (ReAct)',
-                'category': 'Agent'
-            },
-            'reflexion': {
-                'keywords': [r'reflect on', r'self-reflect', r'evaluate your',
-                           r'what went wrong', r'how to improve', r'self-assess',
-                           r'analyze.*performance', r'critique.*yourself',
-                           r'improve.*reasoning', r'better.*response',
-                           r'self-critique', r'critique your answer',
-                           r'review and critique',
-                           r'identify.*errors', r'logical.*errors'],
-                'description': 'AI self-reflection: AI evaluates its own outputs and performance',
-                'category': 'Agent'
-            },
-            'automatic_reasoning': {
-                'keywords': [r'use tools', r'available functions', r'call.*function',
-                           r'external tools'],
-                'description': 'Automatic Reasoning and Tool-use (ART)',
-                'category': 'Agent'
-            },
-            
-            # Retrieval & Context
-            'rag': {
-                'keywords': [r'based on.*context', r'using.*document', r'retrieve',
-                           r'search.*then.*answer', r'given.*information'],
-                'description': 'Retrieval Augmented Generation (RAG)',
-                'category': 'Retrieval'
-            },
-            'active_prompt': {
-                'keywords': [r'most uncertain', r'need clarification', r'ask questions',
-                           r'what else.*need'],
-                'description': 'Actively seeks clarification',
-                'category': 'Retrieval'
-            },
-            
-            # Output Control
-            'directional_stimulus': {
-                'keywords': [r'focus on', r'emphasize', r'pay attention to',
-                           r'highlight', r'prioritize'],
-                'description': 'Guides attention to specific aspects',
-                'category': 'Control'
-            },
-            'constraint_setting': {
-                'keywords': [r'must include', r'do not', r'avoid', r'only',
-                           r'ensure that', r'specifically', r'focus on', r'focusing on'],
-                'description': 'Sets boundaries or requirements',
-                'category': 'Control'
-            },
-            'task_decomposition': {
-                'keywords': [r'review and critique', r'provide.*feedback', r'offer.*suggestions',
-                           r'break.*down', r'step by step', r'analyze.*then'],
-                'description': 'Breaks down complex tasks into specific components',
-                'category': 'Control'
-            },
-            'output_formatting': {
-                'keywords': [r'format', r'structure', r'provide in', r'output as',
-                           r'json', r'table', r'list', r'markdown'],
-                'description': 'Specifies desired output format',
-                'category': 'Control'
-            },
-            
-            # Meta Patterns
-            'meta_prompting': {
-                'keywords': [r'improve.*prompt', r'better.*question', r'rewrite.*query',
-                           r'optimize.*instruction'],
-                'description': 'Prompts about prompts',
-                'category': 'Meta'
-            },
-            'automatic_prompt_engineer': {
-                'keywords': [r'generate.*prompt', r'create.*instruction', 
-                           r'design.*template'],
-                'description': 'Automatic Prompt Engineering (APE)',
-                'category': 'Meta'
-            },
-            
-            # Multimodal
-            'multimodal_cot': {
-                'keywords': [r'analyze.*image', r'visual.*reasoning', r'describe.*then',
-                           r'based on.*picture'],
-                'description': 'Chain-of-Thought with multimodal inputs',
-                'category': 'Multimodal'
-            },
-            
-            # Traditional Patterns
-            'task_specification': {
-                'keywords': [r'generate', r'create', r'write', r'analyze', 
-                           r'review', r'explain', r'summarize'],
-                'description': 'Clearly defines the task',
-                'category': 'Basic'
-            },
-            'iterative_refinement': {
-                'keywords': [r'if.*feedback', r'refine', r'enhance', r'iterate',
-                           r'improve.*previous'],
-                'description': 'Includes feedback loop instructions',
-                'category': 'Control'
-            },
-            'persona_context': {
-                'keywords': [r'known for', r'expert in', r'specialized',
-                           r'with experience'],
-                'description': 'Adds context or credentials to the role',
-                'category': 'Basic'
-            },
-            'goal_oriented': {
-                'keywords': [r'goal', r'objective', r'aim', r'purpose',
-                           r'for maximum', r'to ensure'],
-                'description': 'Defines success criteria',
-                'category': 'Control'
-            },
-            'audience_awareness': {
-                'keywords': [r'audience', r'reader', r'for.*users', r'target'],
-                'description': 'Considers the end audience',
-                'category': 'Control'
-            },
-
-            # Content Analysis & Critique (Peer Review)
-            'peer_review': {
-                'keywords': [r'review.*tweet', r'critique.*content', r'feedback.*post',
-                           r'analyze.*writing', r'evaluate.*message', r'assess.*communication',
-                           r'content.*review', r'writing.*feedback', r'social.*media.*analysis',
-                           r'provide.*feedback', r'constructive.*criticism',
-                           r'review and critique', r'provide constructive feedback',
-                           r'offer specific suggestions', r'make.*compelling',
-                           r'enhancing.*depth', r'overall.*impact'],
-                'description': 'Content critique: AI analyzes and evaluates external content',
-                'category': 'Analysis'
-            }
-        }
+        # Patterns and their matchers are built once at import and shared by all detectors
+        self.patterns = _PATTERNS
+        self._compiled_keywords = _COMPILED_KEYWORDS
+        self._few_shot_compiled = _COMPILED_KEYWORDS['few_shot']
+        self._literal_keywords = _LITERAL_KEYWORDS
+        self._literal_automaton = _LITERAL_AUTOMATON
+        # Recent prompt -> detection results; PatternMatch is immutable, so results can be shared
+        self._detection_cache: "OrderedDict[bytes, Dict[str, PatternMatch]]" = OrderedDict()
+        self._detection_cache_lock = threading.Lock()
+
+    def _literal_hits(self, prompt_lower: str) -> Optional[Dict[Tuple[str, int], List[Tuple[int, int]]]]:
+        """Return the (start, end) spans of every literal keyword in one scan, or None without pyahocorasick."""
+        if self._literal_automaton is None:
+            return None
+        hits = defaultdict(list)
+        for end_index, (length, labels) in self._literal_automaton.iter(prompt_lower):
+            start = end_index - length + 1
+            for label in labels:
+                spans = hits[label]
+                # Like re.finditer, do not report a keyword overlapping its own previous hit
+                if spans and start < spans[-1][1]:
+                    continue
+                spans.append((start, end_index + 1))
+        return hits
     
     def detect_patterns(self, prompt: str) -> dict[str, PatternMatch]:
-        """Detect all patterns in a given prompt"""
+        """Detect all patterns in a given prompt (results for recent prompts are cached)"""
+        # Keyed by a digest so the cache does not keep large prompts alive
+        key = hashlib.blake2b(prompt.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._detection_cache_lock:
+            cached = self._detection_cache.get(key)
+            if cached is not None:
+                self._detection_cache.move_to_end(key)
+                return dict(cached)
+
+        detected = self._detect_patterns(prompt)
+        with self._detection_cache_lock:
+            self._detection_cache[key] = detected
+            if len(self._detection_cache) > DETECTION_CACHE_SIZE:
+                self._detection_cache.popitem(last=False)
+        # Callers get their own dict, so they cannot change the cached one
+        return dict(detected)
+
+    def _detect_patterns(self, prompt: str) -> dict[str, PatternMatch]:
+        """Run the keyword scan over a prompt"""
         prompt_lower = prompt.lower()
+        literal_hits = self._literal_hits(prompt_lower)
         detected = {}
 
         for pattern_name, pattern_info in self.patterns.items():
             matches = []
-            confidence = 0.0
+            hit_count = 0
 
             # Special handling for zero-shot
             if pattern_name == 'zero_shot':
-                is_few_shot = any(re.search(kw, prompt_lower) for kw in self.patterns['few_shot']['keywords'])
+                is_few_shot = any(regex.search(prompt_lower) for regex in self._few_shot_compiled)
                 if not is_few_shot:
                     detected[pattern_name] = PatternMatch(
                         pattern=pattern_name,
@@ -215,22 +430,38 @@ class AdvancedPromptPatternDetector:
                     )
                 continue
 
+            required = _KEYWORD_PREFILTER.get(pattern_name)
+            if required is not None and not any(literal in prompt_lower for literal in required):
+                continue
+
             # Check for keyword matches
-            for keyword in pattern_info.get('keywords', []):
-                regex_matches = re.finditer(keyword, prompt_lower, re.IGNORECASE)
-                for match in regex_matches:
-                    start = max(0, match.start() - 30)
-                    end = min(len(prompt), match.end() + 30)
-                    context = prompt[start:end].strip()
-                    matches.append(f"...{context}...")
-                    confidence += 0.35
-
-            if matches:
-                confidence = min(confidence, 1.0)
+            literals = self._literal_keywords[pattern_name]
+            for index, keyword_regex in enumerate(self._compiled_keywords[pattern_name]):
+                literal = literals[index]
+                if literal is None:
+                    spans = (match.span() for match in keyword_regex.finditer(prompt_lower))
+                elif literal_hits is not None:
+                    spans = literal_hits.get((pattern_name, index), ())
+                else:
+                    spans = _find_spans(prompt_lower, literal)
+                for match_start, match_end in spans:
+                    hit_count += 1
+                    # Only the first hits are quoted as evidence; later ones just add confidence
+                    if len(matches) < MAX_EVIDENCE:
+                        start = max(0, match_start - 30)
+                        end = min(len(prompt), match_end + 30)
+                        context = prompt[start:end]
+                        matches.append(f"...{context}...")
+                    if hit_count >= SATURATING_HITS:
+                        break
+                if hit_count >= SATURATING_HITS:
+                    break
+
+            if hit_count:
                 detected[pattern_name] = PatternMatch(
                     pattern=pattern_name,
-                    confidence=confidence,
-                    evidence=matches[:3],
+                    confidence=min(hit_count * KEYWORD_HIT_CONFIDENCE, 1.0),
+                    evidence=matches,
                     description=pattern_info['description'],
                     category=pattern_info['category']
                 )
@@ -246,58 +477,67 @@ class AdvancedPromptPatternDetector:
         
         if format_type == "json":
             return self._format_json(prompt, patterns)
-        elif format_type == "markdown":
-            return self._format_markdown(prompt, patterns)
+
+        # Text and markdown reports share one grouping, sorted by confidence within each category
+        grouped = self._group_by_category(patterns)
+        if format_type == "markdown":
+            return self._format_markdown(prompt, patterns, grouped)
         else:
-            return self._format_text(prompt, patterns)
+            return self._format_text(prompt, patterns, grouped)
     
-    def _format_text(self, prompt: str, patterns: Dict[str, PatternMatch]) -> str:
+    def _format_text(self, prompt: str, patterns: Dict[str, PatternMatch],
+                     grouped: "OrderedDict[str, List[PatternMatch]]") -> str:
         """Format as plain text"""
         if not patterns:
             return "No clear prompt patterns detected."
         
-        report = "=" * 60 + "\n"
-        report += "PROMPT PATTERN ANALYSIS\n"
-        report += "=" * 60 + "\n\n"
-        report += f"Prompt Length: {len(prompt)} characters\n"
-        report += f"Patterns Detected: {len(patterns)}\n\n"
-        
-        # Group by category
-        by_category = {}
-        for name, match in patterns.items():
-            cat = match.category
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append((name, match))
+        rule = "=" * 60
+        parts = [
+            f"{rule}\nPROMPT PATTERN ANALYSIS\n{rule}\n\n",
+            f"Prompt Length: {len(prompt)} characters\n",
+            f"Patterns Detected: {len(patterns)}\n\n",
+        ]
         
         # Display by category
-        for category in ['Basic', 'Reasoning', 'Agent', 'Retrieval', 'Control', 'Meta', 'Multimodal', 'Analysis']:
-            if category not in by_category:
+        for category, matches in grouped.items():
+            if category not in CATEGORY_ORDER:
                 continue
             
-            report += f"\n{'=' * 60}\n"
-            report += f"📂 {category.upper()} PATTERNS\n"
-            report += f"{'=' * 60}\n\n"
-            
-            sorted_patterns = sorted(
-                by_category[category],
-                key=lambda x: x[1].confidence,
-                reverse=True
-            )
+            parts.append(f"\n{rule}\n📂 {category.upper()} PATTERNS\n{rule}\n\n")
             
-            for pattern_name, match in sorted_patterns:
-                report += f"📌 {pattern_name.upper().replace('_', ' ')}\n"
-                report += f"   Confidence: {match.confidence:.2f} | {self._confidence_bar(match.confidence)}\n"
-                report += f"   Description: {match.description}\n"
+            for match in matches:
+                parts.append(f"📌 {match.pattern.upper().replace('_', ' ')}\n")
+                parts.append(f"   Confidence: {match.confidence:.2f} | {self._confidence_bar(match.confidence)}\n")
+                parts.append(f"   Description: {match.description}\n")
                 
                 if match.evidence and match.evidence[0] != "No examples found in prompt":
-                    report += f"   Evidence:\n"
-                    for evidence in match.evidence:
-                        report += f"      • {evidence}\n"
-                report += "\n"
+                    parts.append("   Evidence:\n")
+                    parts.extend(f"      • {evidence}\n" for evidence in match.evidence)
+                parts.append("\n")
         
-        return report
+        return "".join(parts)
     
+    @staticmethod
+    def _group_by_category(patterns: Dict[str, PatternMatch]) -> "OrderedDict[str, List[PatternMatch]]":
+        """
+        Group matches by category, highest confidence first within each category.
+        Categories follow CATEGORY_ORDER; any others come after, in order of appearance.
+        """
+        by_category = defaultdict(list)
+        for match in patterns.values():
+            by_category[match.category].append(match)
+
+        grouped = OrderedDict()
+        for category in CATEGORY_ORDER:
+            if category in by_category:
+                grouped[category] = by_category.pop(category)
+        grouped.update(by_category)
+
+        confidence = attrgetter('confidence')
+        for matches in grouped.values():
+            matches.sort(key=confidence, reverse=True)
+        return grouped
+
     def _format_json(self, prompt: str, patterns: Dict[str, PatternMatch]) -> str:
         """Format as JSON"""
         result = {
@@ -314,40 +554,37 @@ class AdvancedPromptPatternDetector:
                 "evidence": match.evidence[:3]
             }
         
-        return json.dumps(result, indent=2)
+        return orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
     
-    def _format_markdown(self, prompt: str, patterns: Dict[str, PatternMatch]) -> str:
+    def _format_markdown(self, prompt: str, patterns: Dict[str, PatternMatch],
+                         grouped: "OrderedDict[str, List[PatternMatch]]") -> str:
         """Format as Markdown"""
-        report = "# Prompt Pattern Analysis\n\n"
-        report += f"**Prompt Length:** {len(prompt)} characters\n\n"
-        report += f"**Patterns Detected:** {len(patterns)}\n\n"
-        
-        by_category = {}
-        for name, match in patterns.items():
-            cat = match.category
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append((name, match))
+        parts = [
+            "# Prompt Pattern Analysis\n\n",
+            f"**Prompt Length:** {len(prompt)} characters\n\n",
+            f"**Patterns Detected:** {len(patterns)}\n\n",
+        ]
         
-        for category, items in by_category.items():
-            report += f"\n## {category} Patterns\n\n"
+        for category, matches in grouped.items():
+            parts.append(f"\n## {category} Patterns\n\n")
             
-            for pattern_name, match in items:
-                report += f"### {pattern_name.replace('_', ' ').title()}\n\n"
-                report += f"- **Confidence:** {match.confidence:.2f}\n"
-                report += f"- **Description:** {match.description}\n\n"
+            for match in matches:
+                parts.append(f"### {match.pattern.replace('_', ' ').title()}\n\n")
+                parts.append(f"- **Confidence:** {match.confidence:.2f}\n")
+                parts.append(f"- **Description:** {match.description}\n\n")
                 
                 if match.evidence and match.evidence[0] != "No examples found in prompt":
-                    report += "**Evidence:**\n"
-                    for evidence in match.evidence:
-                        report += f"- {evidence}\n"
-                report += "\n"
+                    parts.append("**Evidence:**\n")
+                    parts.extend(f"- {evidence}\n" for evidence in match.evidence)
+                parts.append("\n")
         
-        return report
+        return "".join(parts)
     
     def _confidence_bar(self, confidence: float) -> str:
         """Visual confidence bar"""
         filled = int(confidence * 10)
+        if 0 <= filled <= 10:
+            return _CONFIDENCE_BARS[filled]
         return "█" * filled + "░" * (10 - filled)
     
     def get_template(self, pattern_name: str) -> str:
@@ -420,29 +657,20 @@ Ensure each component is addressed thoroughly."""
         meta_prompt = self._create_refinement_meta_prompt(original_prompt, detected_patterns)
 
         try:
+            # dspy is only needed here, so workers that never refine do not import it
+            import dspy
+            from ..services.dspy_service import DspyService
+
             # Configure LLM
             dspy_service = DspyService()
             llm = dspy_service.configure_llm(provider, model, api_key)
 
-            # Create DSPy signature for pattern refinement
-            class PatternRefinementSignature(dspy.Signature):
-                """Refine prompt pattern detection results."""
-                meta_prompt = dspy.InputField()
-                refined_json = dspy.OutputField(desc="JSON object with refined pattern analysis")
-
             # Get LLM response using dspy.context
             try:
                 with dspy.context(lm=llm):
-                    try:
-                        # Try modern DSPy syntax first
-                        refinement_program = dspy.Predict(PatternRefinementSignature)
-                        response = refinement_program(meta_prompt=meta_prompt)
-                        refined_json = response.refined_json
-                    except AttributeError:
-                        # Fallback for different DSPy versions
-                        refinement_program = dspy.Predict(PatternRefinementSignature)
-                        response = refinement_program(meta_prompt=meta_prompt)
-                        refined_json = getattr(response, 'refined_json', str(response))
+                    response = _get_refinement_program()(meta_prompt=meta_prompt)
+                    # Older DSPy versions may not expose the output field as an attribute
+                    refined_json = getattr(response, 'refined_json', str(response))
 
                 # Parse and return refined results
                 return self._parse_llm_refinement_response(refined_json, detected_patterns)
@@ -464,14 +692,9 @@ Ensure each component is addressed thoroughly."""
     def _create_refinement_meta_prompt(self, original_prompt: str, detected_patterns: Dict[str, PatternMatch]) -> str:
         """Create a meta-prompt for LLM pattern refinement."""
 
-        # List all available patterns
-        available_patterns = list(self.patterns.keys())
-        available_patterns_str = "\n".join(f"- {pattern}" for pattern in available_patterns)
-
         # Format detected patterns
-        detected_str = ""
-        for name, match in detected_patterns.items():
-            detected_str += f"""
+        detected_str = "".join(
+            f"""
 Pattern: {name}
 Confidence: {match.confidence}
 Description: {match.description}
@@ -479,81 +702,24 @@ Evidence: {', '.join(match.evidence[:2])}
 Category: {match.category}
 ---
 """
+            for name, match in detected_patterns.items()
+        )
 
-        meta_prompt = f"""
-You are an expert prompt engineering analyst. Review the following prompt and the patterns detected by an automated system.
-
-**Original Prompt:**
-{original_prompt}
-
-**Automatically Detected Patterns:**
-{detected_str}
-
-**Available Pattern Types:**
-{available_patterns_str}
-
-**Your Task:**
-Review the original prompt and the detected patterns. Then:
-
-1. **Correct any mistakes** in the automated detection
-2. **Add any missing patterns** from the available list that should be detected
-3. **Remove patterns** that don't actually apply
-4. **Adjust confidence scores** (0.0-1.0) based on how well each pattern fits
-5. **Add evidence** for each pattern you include
-
-**Response Format:**
-You MUST respond with a JSON object in this EXACT format:
-{{
-    "patterns": {{
-        "zero_shot": {{
-            "confidence": 0.7,
-            "evidence": ["No clear examples found, suggesting a zero-shot approach."],
-            "description": "Direct task without examples",
-            "category": "Basic"
-        }},
-        "role_prompting": {{
-            "confidence": 0.9,
-            "evidence": ["You are a Twitter expert assigned to craft outstanding tweets."],
-            "description": "Assigns a specific role or persona",
-            "category": "Basic"
-        }}
-    }}
-}}
-
-**Guidelines:**
-- Only include patterns that are actually present in the prompt
-- Focus on the most relevant and confident patterns (aim for 3-8 patterns max)
-- Provide specific evidence from the prompt text
-- Be conservative with high confidence scores (0.8+ only for very clear matches)
-- Consider pattern interactions and hierarchies
-
-**Critical:** Respond ONLY with the JSON object, no explanations, no markdown formatting, no additional text.
-"""
-
-        return meta_prompt
+        return _REFINEMENT_META_PROMPT_TEMPLATE.format_map({
+            "original_prompt": original_prompt,
+            "detected_str": detected_str,
+            "available_patterns_str": _AVAILABLE_PATTERNS_STR
+        })
 
     def _parse_llm_refinement_response(self, llm_response: str, fallback_patterns: Dict[str, PatternMatch]) -> Dict[str, PatternMatch]:
         """Parse the LLM's JSON response and create PatternMatch objects."""
         try:
-            # Clean the response (remove markdown formatting if present)
-            cleaned_response = llm_response.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-
-            # Try to parse JSON
-            try:
-                parsed = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                # If direct parsing fails, try to extract JSON from the response
-                json_match = re.search(r'\{.*\}', cleaned_response, re.DOTALL)
-                if json_match:
-                    parsed = json.loads(json_match.group())
-                else:
-                    print(f"Could not extract JSON from response: {cleaned_response}")
-                    return fallback_patterns
+            # Extract the JSON object, whatever fences or prose the LLM wrapped around it
+            json_match = _JSON_BLOCK_RE.search(llm_response)
+            if not json_match:
+                print(f"Could not extract JSON from response: {llm_response}")
+                return fallback_patterns
+            parsed = orjson.loads(json_match.group())
 
             # Handle different response formats
             refined_patterns = {}
@@ -0,0 +1,63 @@
+"""
+Local prompt template repository.
+
+Each template lives in templates/<slug>.txt (e.g. templates/rlm/rag-prompt.txt).
+Only the compact templates/index.json (slug -> variables) is read at import;
+a template's content is read from disk the first time it is requested and then
+kept in memory. Run scripts/build_template_index.py after adding or editing
+template files.
+"""
+import json
+import sys
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+INDEX_FILE = TEMPLATES_DIR / "index.json"
+
+
+def _load_index() -> Dict[str, dict]:
+    with INDEX_FILE.open(encoding="utf-8") as f:
+        variables_by_slug = json.load(f)
+    # Slugs are interned so lookups with the hub service's (also interned) slugs compare by identity.
+    return {
+        sys.intern(slug): {"variables": variables, "path": TEMPLATES_DIR / f"{slug}.txt"}
+        for slug, variables in variables_by_slug.items()
+    }
+
+
+TEMPLATE_INDEX: Dict[str, dict] = _load_index()
+
+
+@lru_cache(maxsize=None)
+def read_template(slug: str) -> str:
+    """Return the content of a local template, reading it from disk only once."""
+    return TEMPLATE_INDEX[slug]["path"].read_text(encoding="utf-8")
+
+
+def template_variables(slug: str) -> List[str]:
+    """Return the precomputed variable names of a local template."""
+    return TEMPLATE_INDEX[slug]["variables"]
+
+
+class LocalTemplates(Mapping):
+    """Read-only slug -> content mapping that loads each template on first access."""
+
+    def __getitem__(self, slug: str) -> str:
+        if slug not in TEMPLATE_INDEX:
+            raise KeyError(slug)
+        return read_template(slug)
+
+    def __contains__(self, slug) -> bool:
+        return slug in TEMPLATE_INDEX
+
+    def __iter__(self):
+        return iter(TEMPLATE_INDEX)
+
+    def __len__(self) -> int:
+        return len(TEMPLATE_INDEX)
+
+
+LOCAL_TEMPLATES = LocalTemplates()
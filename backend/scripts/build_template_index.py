@@ -0,0 +1,45 @@
+"""
+Regenerate app/services/templates/index.json from the template files.
+
+The index maps every template slug (its path under the templates directory,
+without the .txt suffix) to the variables it contains, so the server can
+list templates and their variables without reading every file at startup.
+Slugs keep their existing order; new templates are appended.
+
+Usage (from the backend directory):
+    python scripts/build_template_index.py
+"""
+import json
+import re
+from pathlib import Path
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / 'app' / 'services' / 'templates'
+INDEX_FILE = TEMPLATES_DIR / 'index.json'
+
+_VAR_RE = re.compile(r'\{([^}]+)\}')
+
+
+def main():
+    paths = {
+        path.relative_to(TEMPLATES_DIR).with_suffix('').as_posix(): path
+        for path in TEMPLATES_DIR.rglob('*.txt')
+    }
+
+    # Keep the existing slug order, which is also the order similar-template lookups
+    # try slugs in; new templates are appended in sorted order
+    existing = json.loads(INDEX_FILE.read_text(encoding='utf-8')) if INDEX_FILE.exists() else {}
+    ordered = [slug for slug in existing if slug in paths]
+    ordered += sorted(slug for slug in paths if slug not in existing)
+
+    index = {}
+    for slug in ordered:
+        content = paths[slug].read_text(encoding='utf-8')
+        # Unique variables in order of first appearance
+        index[slug] = list(dict.fromkeys(_VAR_RE.findall(content)))
+
+    INDEX_FILE.write_text(json.dumps(index, indent=2) + "\n", encoding='utf-8')
+    print(f"Indexed {len(index)} templates in {INDEX_FILE}")
+
+
+if __name__ == "__main__":
+    main()
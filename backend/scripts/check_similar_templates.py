@@ -0,0 +1,60 @@
+"""
+Check that the similar-template lookup picks the same local template as a plain
+linear scan over LOCAL_TEMPLATES, for every local slug and a few variants of it.
+
+Usage (from the backend directory):
+    python scripts/check_similar_templates.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.hub_service import _find_similar_slug  # noqa: E402
+from app.services.template_store import LOCAL_TEMPLATES  # noqa: E402
+
+# Cases whose expected result is fixed, not just derived from the scan
+EXPECTED = {
+    'hwchase17/react-chat-v2': 'hwchase17/react-chat',
+    'rlm/rag-prompt-cot-v2': 'rlm/rag-prompt',
+}
+
+
+def linear_scan(template_slug):
+    for existing_slug in LOCAL_TEMPLATES.keys():
+        if template_slug in existing_slug or existing_slug in template_slug:
+            return existing_slug
+    return None
+
+
+def variants(slug):
+    basename = slug.rsplit('/', 1)[-1]
+    yield slug
+    yield slug + '-v2'
+    yield 'someone/' + basename
+    yield basename
+    yield basename.upper()
+    for length in (1, 2, 3, 5, len(slug) // 2):
+        yield slug[:length]
+        yield slug[-length:]
+
+
+def main():
+    queries = {query for slug in LOCAL_TEMPLATES for query in variants(slug)}
+    queries.update(EXPECTED)
+    queries.update(['', 'unknown/template', 'x'])
+
+    failures = 0
+    for query in sorted(queries):
+        expected = EXPECTED.get(query, linear_scan(query))
+        found = _find_similar_slug(query)
+        if found != expected:
+            failures += 1
+            print(f"MISMATCH {query!r}: expected {expected!r}, got {found!r}")
+
+    print(f"{len(queries)} slugs checked, {failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
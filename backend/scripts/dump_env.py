@@ -0,0 +1,37 @@
+"""
+Bake .env.local into backend/app/_env_baked.py.
+
+Production startup then fills os.environ from a plain dict literal,
+without importing python-dotenv or parsing the env file.
+
+Usage (from the backend directory):
+    python scripts/dump_env.py
+"""
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ENV_FILE = BACKEND_DIR.parent / '.env.local'
+OUTPUT_FILE = BACKEND_DIR / 'app' / '_env_baked.py'
+
+
+def main():
+    if not ENV_FILE.exists():
+        raise SystemExit(f"{ENV_FILE} not found")
+
+    env = {k: v for k, v in dotenv_values(ENV_FILE).items() if v is not None}
+    lines = [
+        "# Generated by scripts/dump_env.py from .env.local - do not edit or commit.",
+        "from typing import Dict",
+        "",
+        "ENV: Dict[str, str] = {",
+        *(f"    {name!r}: {value!r}," for name, value in sorted(env.items())),
+        "}",
+    ]
+    OUTPUT_FILE.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    print(f"Wrote {len(env)} variables to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()